@@ -1,22 +1,188 @@
 import sys
 import threading
 import os
-import csv
 import socket
+import time
+import logging
+import types
+import importlib.util
+
+STARTED = time.perf_counter()   # for the startup benchmark
 
 from PySide6 import QtCore, QtWidgets, QtGui
 from pathlib import Path
-from urllib.request import urlopen
 
 
-import client
-import server
+# module that is only loaded the first time one of its attributes is used
+def lazy_import(name: str):
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+# lazy modules change back to a plain module class once something has used them
+def is_loaded(module) -> bool:
+    return type(module) is types.ModuleType
+
+
+# client and server pull in cv2, numpy, mss, pynput and cryptography, load them when a page needs them
+client = lazy_import("client")
+server = lazy_import("server")
+discovery = lazy_import("discovery")
+clipsync = lazy_import("clipsync")
+metrics = lazy_import("metrics")
+
+import shaper
+import registry
 
 # set values for streaming 
 FPS = 15
 SCALE = .6
 JPEG_QUALITY = 70
 
+# link sharing between input, video and file traffic (Mbit/s, 0 = no limit)
+UPLOAD_LIMIT = 0
+VIDEO_MIN = 2
+
+
+# video display, paints only the newest frame from the worker's mailbox
+class VideoWidget(QtWidgets.QWidget):
+    frameRect = QtCore.Signal(int, int, int, int)   # global rect the frame is drawn in
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        self.mailbox = None
+        self.image = None       # last frame taken from the mailbox
+        self.pixels = None      # array the image points into
+        self.text = ""          # status text shown when there is no frame
+        self.painted = 0        # frames painted since start
+
+        # aspect fit rect, only recalculated when the widget or frame size changes
+        self.target = QtCore.QRect()
+        self.target_key = None
+        self.global_rect = None
+
+        self.background = QtGui.QColor("#111")
+        self.text_color = QtGui.QColor("#aaa")
+
+        self.setAttribute(QtCore.Qt.WA_OpaquePaintEvent)    # every pixel is painted here
+        self.setSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Expanding)  # unlock horizontal and vertical axsises 
+
+    def attach(self, mailbox):
+        self.detach()
+        self.mailbox = mailbox
+        self.global_rect = None     # resend the frame rect to the new worker
+        self.mailbox.ready.connect(self.update)     # one repaint per burst of frames
+
+    def detach(self):
+        if self.mailbox is not None:
+            self.mailbox.ready.disconnect(self.update)
+            self.mailbox = None
+
+    def setText(self, text: str):
+        self.text = text
+        self.image = None
+        self.pixels = None
+        self.update()
+
+    def clear(self):
+        self.setText("")
+
+    # scale transform from frame to widget, cached across frames
+    def fit(self, image: QtGui.QImage) -> QtCore.QRect:
+
+        key = (self.width(), self.height(), image.width(), image.height())
+        if key != self.target_key:
+            size = image.size().scaled(self.size(), QtCore.Qt.KeepAspectRatio)
+            x = (self.width() - size.width()) // 2
+            y = (self.height() - size.height()) // 2
+            self.target = QtCore.QRect(x, y, size.width(), size.height())
+            self.target_key = key
+
+        return self.target
+
+    def paintEvent(self, event):
+
+        # newest frame, anything older was already replaced in the mailbox
+        if self.mailbox is not None:
+            frame = self.mailbox.take()
+            if frame is not None:
+                self.image, self.pixels = frame
+                self.text = ""
+                self.painted += 1
+
+        painter = QtGui.QPainter(self)
+        painter.fillRect(self.rect(), self.background)
+
+        if self.image is not None:
+            target = self.fit(self.image)
+            painter.setRenderHint(QtGui.QPainter.SmoothPixmapTransform)
+            painter.drawImage(target, self.image)   # one scaled draw straight to the screen
+
+            # tell the worker where the frame is for mouse calculations
+            top_left = self.mapToGlobal(target.topLeft())
+            rect = (top_left.x(), top_left.y(), target.width(), target.height())
+            if rect != self.global_rect:
+                self.global_rect = rect
+                self.frameRect.emit(*rect)
+
+        elif self.text:
+            painter.setPen(self.text_color)
+            painter.drawText(self.rect(), QtCore.Qt.AlignCenter, self.text)
+
+        painter.end()
+
+
+# collapsible panel of performance counters, only reads them while open
+class StatsPanel(QtWidgets.QWidget):
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        self.toggle = QtWidgets.QToolButton()
+        self.toggle.setText("Stats")
+        self.toggle.setCheckable(True)
+        self.toggle.setArrowType(QtCore.Qt.RightArrow)
+        self.toggle.setToolButtonStyle(QtCore.Qt.ToolButtonTextBesideIcon)
+
+        self.text = QtWidgets.QLabel()
+        self.text.setStyleSheet("color:#888; font-family: monospace; font-size: 11px;")
+        self.text.setTextInteractionFlags(QtCore.Qt.TextSelectableByMouse)
+        self.text.hide()
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.toggle, alignment=QtCore.Qt.AlignLeft)
+        layout.addWidget(self.text)
+
+        self.toggle.toggled.connect(self.set_open)
+
+    def set_open(self, on: bool):
+        self.toggle.setArrowType(QtCore.Qt.DownArrow if on else QtCore.Qt.RightArrow)
+        self.text.setVisible(on)
+        if on:
+            self.refresh()
+            self.timer.start(1000)
+        else:
+            self.timer.stop()
+
+    # three columns so the panel stays short
+    def refresh(self):
+        lines = metrics.summary() or ["no data yet"]
+        rows = (len(lines) + 2) // 3
+        cols = [lines[i * rows:(i + 1) * rows] for i in range(3)]
+        width = max(len(l) for l in lines) + 3
+        self.text.setText("\n".join("".join(c[r].ljust(width) for c in cols if r < len(c)) for r in range(rows)))
+
 
 # page for running client program 
 class ClientPage(QtWidgets.QWidget):
@@ -32,6 +198,8 @@ class ClientPage(QtWidgets.QWidget):
 
         self.transfer_file = QtWidgets.QPushButton("Send Files")
         self.download_file = QtWidgets.QPushButton("Download Files")
+        self.record_button = QtWidgets.QPushButton("Record")
+        self.record_button.setCheckable(True)
 
         # public/private ip sellect
         self.ip_type_label = QtWidgets.QLabel("IP type: ")
@@ -40,19 +208,39 @@ class ClientPage(QtWidgets.QWidget):
 
         self.button = QtWidgets.QPushButton("Connect")
 
+        # live stream settings, sent to the server mid session
+        self.stream_fps = QtWidgets.QSpinBox()
+        self.stream_fps.setRange(1, 60)
+        self.stream_fps.setValue(FPS)
+        self.stream_scale = QtWidgets.QComboBox()
+        for scale in (1.0, 0.75, 0.6, 0.5, 0.25):
+            self.stream_scale.addItem(f"{scale}x", scale)
+        self.stream_scale.setCurrentIndex(2)
+        self.stream_quality = QtWidgets.QSpinBox()
+        self.stream_quality.setRange(10, 100)
+        self.stream_quality.setValue(JPEG_QUALITY)
+        self.stream_codec = QtWidgets.QComboBox()
+        self.stream_codec.addItems(["jpeg", "webp"])
+        self.stream_apply = QtWidgets.QPushButton("Apply")
+
         self.back_button = QtWidgets.QPushButton("Back")
         self.back_button.setFixedSize(80, 30)
 
         # video display box
-        self.video_box = QtWidgets.QLabel()
-        self.video_box.setAlignment(QtCore.Qt.AlignCenter)
-        self.video_box.setStyleSheet("background:#111; color:#aaa;")
+        self.video_box = VideoWidget()
         self.video_box.setText("Video feed will appear here")
         self.video_box.setMouseTracking(True)       # track mouse within video box
         self.video_box.setFocusPolicy(QtCore.Qt.StrongFocus)    # set keyboard focus
         self.video_box.installEventFilter(self)     # allows intercepting inputs 
-        self.video_box.setScaledContents(True)    # allow resizeing image
-        self.video_box.setSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Expanding)  # unlock horizontal and vertical axsises 
+        self.video_box.frameRect.connect(self.frame_rect_changed)
+        self.painted_last = 0
+
+        # live upload counters per traffic class
+        self.link_label = QtWidgets.QLabel()
+        self.link_label.setStyleSheet("color:#888;")
+        self.link_timer = QtCore.QTimer(self)
+        self.link_timer.timeout.connect(self.update_link_label)
+        self.link_timer.start(1000)
 
         
         # align host text and input box
@@ -67,18 +255,35 @@ class ClientPage(QtWidgets.QWidget):
         #self.ip_type_line.addItem(QtWidgets.QSpacerItem(0, 0, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum))        
         self.ip_type_line.addWidget(self.transfer_file)    # shoving this here
         self.ip_type_line.addWidget(self.download_file)    # not realy a ip line anymore
+        self.ip_type_line.addWidget(self.record_button)
         # fix spacing of these items
         self.ip_type_line.setStretch(0, 0)
         self.ip_type_line.setStretch(1, 1)
         self.ip_type_line.setStretch(2, 1)
         self.ip_type_line.setStretch(3, 1)
+        self.ip_type_line.setStretch(4, 1)
+
+        # stream settings line
+        self.stream_line = QtWidgets.QHBoxLayout()
+        self.stream_line.addWidget(QtWidgets.QLabel("FPS:"))
+        self.stream_line.addWidget(self.stream_fps)
+        self.stream_line.addWidget(QtWidgets.QLabel("Scale:"))
+        self.stream_line.addWidget(self.stream_scale)
+        self.stream_line.addWidget(QtWidgets.QLabel("Quality:"))
+        self.stream_line.addWidget(self.stream_quality)
+        self.stream_line.addWidget(QtWidgets.QLabel("Codec:"))
+        self.stream_line.addWidget(self.stream_codec)
+        self.stream_line.addWidget(self.stream_apply)
 
         # page layout 
         self.layout = QtWidgets.QVBoxLayout(self)
         self.layout.addWidget(self.back_button, alignment = QtCore.Qt.AlignRight)
         self.layout.addWidget(self.video_box)
+        self.layout.addWidget(self.link_label)
+        self.layout.addWidget(StatsPanel())
         self.layout.addLayout(self.host_line)
         self.layout.addLayout(self.ip_type_line)
+        self.layout.addLayout(self.stream_line)
         self.layout.addWidget(self.button)
 
         # button presses
@@ -86,6 +291,8 @@ class ClientPage(QtWidgets.QWidget):
         self.back_button.clicked.connect(lambda: stacked_widget.setCurrentIndex(0))
         self.transfer_file.clicked.connect(self.innitate_transfer)
         self.download_file.clicked.connect(self.innitate_download)
+        self.record_button.toggled.connect(self.toggle_recording)
+        self.stream_apply.clicked.connect(self.apply_stream_settings)
 
 
     # runs client program in seperate thread
@@ -107,26 +314,30 @@ class ClientPage(QtWidgets.QWidget):
         else:
             use_public = None
 
-        # convert name to ip  
-        ip = client.getip(name, use_public = use_public)
+        # convert name to ip addresses, preferred first, the worker races them
+        addrs = client.host_addresses(name, use_public = use_public)
 
         # check if ip exists 
-        if not ip:
-            QtWidgets.QMessageBox.warning(self, "Unknown host", f"No IP found for '{name}' in hosts.csv")
+        if not addrs:
+            QtWidgets.QMessageBox.warning(self, "Unknown host", f"No IP found for '{name}' in the device list")
             return
 
+        clipboard_bridge()
+
         # create qthread and client worker objects
         self.client_thread = QtCore.QThread(self)   # for event loop container
-        self.client_worker = client.ClientWorker(ip)    # for networking loop
+        self.client_worker = client.ClientWorker(addrs, name=name)    # for networking loop
 
         # move worker to run in the client thread
         self.client_worker.moveToThread(self.client_thread)
 
         # connect signals
         self.client_thread.started.connect(self.client_worker.start)
-        self.client_worker.frameReady.connect(self.Qt_frame)
+        self.video_box.attach(self.client_worker.mailbox)
         self.client_worker.statusText.connect(self.video_box_status_text)
         self.client_worker.closed.connect(self.close_client)
+        self.client_worker.fileError.connect(self.show_file_error)
+        self.client_worker.streamSettings.connect(self.show_stream_settings)
 
         # shutdown
         self.client_thread.finished.connect(self.client_thread.deleteLater)
@@ -135,6 +346,28 @@ class ClientPage(QtWidgets.QWidget):
         self.client_thread.start()
 
 
+    # change the running stream without reconnecting
+    def apply_stream_settings(self):
+        if not hasattr(self, "client_worker"):
+            return
+        self.client_worker.set_stream(fps=self.stream_fps.value(), scale=self.stream_scale.currentData(),
+                                      quality=self.stream_quality.value(), codec=self.stream_codec.currentText())
+
+    # what the server actually applied (values are clamped to its limits)
+    def show_stream_settings(self, settings: dict):
+        self.stream_fps.setValue(int(settings.get("fps", self.stream_fps.value())))
+        self.stream_quality.setValue(int(settings.get("quality", self.stream_quality.value())))
+        i = self.stream_scale.findData(settings.get("scale"))
+        if i < 0 and "scale" in settings:
+            self.stream_scale.addItem(f"{settings['scale']}x", settings["scale"])
+            i = self.stream_scale.count() - 1
+        if i >= 0:
+            self.stream_scale.setCurrentIndex(i)
+        j = self.stream_codec.findText(settings.get("codec", ""))
+        if j >= 0:
+            self.stream_codec.setCurrentIndex(j)
+
+
     def eventFilter(self, obj, event):
 
         if obj is self.video_box and hasattr(self, "client_worker"):
@@ -162,41 +395,53 @@ class ClientPage(QtWidgets.QWidget):
         return super().eventFilter(obj, event)
 
 
-    # display qimage as pixmap 
-    @QtCore.Slot(QtGui.QImage)
-    def Qt_frame(self, qimg: QtGui.QImage):
+    # area of the screen the frame is drawn in, for mouse calculations
+    @QtCore.Slot(int, int, int, int)
+    def frame_rect_changed(self, x, y, w, h):
+        if hasattr(self, "client_worker"):  # prevent attribute error crash
+            self.client_worker.set_window_rect(x, y, w, h)
 
-        # set up display
-        pixmap = QtGui.QPixmap.fromImage(qimg)
-        scaled = pixmap.scaled(self.video_box.size(), QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation)    # scale video to window size
-        self.video_box.setPixmap(scaled)     
+    # upload rates plus how many frames were painted / skipped in the last second
+    def update_link_label(self):
+        text = shaper.summary()
 
-        # collect video box dimensions
-        top_left = self.video_box.mapToGlobal(QtCore.QPoint(0, 0))  
-        w = self.video_box.width()
-        h = self.video_box.height()
+        if hasattr(self, "client_worker"):
+            painted = self.video_box.painted - self.painted_last
+            self.painted_last = self.video_box.painted
+            text += f"   painted {painted} fps   dropped {self.client_worker.dropped_frames()}"
 
-        if hasattr(self, "client_worker"):  # prevent attribute error crash
-            self.client_worker.set_window_rect(top_left.x(), top_left.y(), w, h)
+        self.link_label.setText(text)
 
 
     # changes status text for video box 
     @QtCore.Slot(str)
     def video_box_status_text(self, text: str):
         if text:
-            self.video_box.clear()     # make sure the pixmap gets cleared
-            self.video_box.setText(text)
+            self.video_box.setText(text)     # replaces the last frame
 
 
     # close out client
     @QtCore.Slot()
     def close_client(self):
-        if self.client_thread.isRunning() and hasattr(self, "client_thread"):
+
+        # a session replaced by a newer one (ie: opened from the dashboard) only shuts down its own thread,
+        # the page and the video box belong to the new session by now
+        worker = self.sender()
+        if worker is not None and worker is not self.client_worker:
+            thread = worker.thread()
+            thread.quit()
+            thread.wait(500)
+            return
+
+        if hasattr(self, "client_thread") and self.client_thread.isRunning():
             self.client_thread.quit()
             self.client_thread.wait(500)
 
+            # recording ends with the session
+            self.record_button.setChecked(False)
+
             # clear and display notification
-            self.video_box.clear()
+            self.video_box.detach()
             self.video_box.setText("Client disconnected.")
 
     
@@ -279,21 +524,219 @@ class ClientPage(QtWidgets.QWidget):
             QtWidgets.QMessageBox.warning(self, "Not connected", "You must connect to a host before downloading files.")
             return
 
-        # get path from user
-        path, ok = QtWidgets.QInputDialog.getText(self, "Request file", "Server file path:")
+        # pick a file from the server's file system
+        browser = RemoteBrowser(self.client_worker, self)
+        browser.exec()
 
-        # if user does not give input cancel
-        if not ok or not path.strip():
+    # start / stop saving the session to recordings/
+    def toggle_recording(self, checked: bool):
+
+        connected = hasattr(self, "client_worker") and self.client_worker.client_running
+
+        if checked and not connected:
+            QtWidgets.QMessageBox.warning(self, "Not connected", "You must connect to a host before recording.")
+            self.record_button.setChecked(False)
             return
 
-        self.client_worker.send_command({
-            "type": "request_file",
-            "path": path.strip(),
-        })
+        if checked:
+            path = os.path.join("recordings", time.strftime("session-%Y%m%d-%H%M%S.rpcrec"))
+            self.client_worker.start_recording(path)
+            self.record_button.setText("Stop Recording")
+        else:
+            if hasattr(self, "client_worker"):
+                self.client_worker.stop_recording()
+            self.record_button.setText("Record")
+
+    @QtCore.Slot(str)
+    def show_file_error(self, text: str):
+        QtWidgets.QMessageBox.warning(self, "Download failed", text)
+
+
+# format byte counts for display
+def human_size(n: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024:
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} TB"
+
+
+# dialog for picking a file on the server
+class RemoteBrowser(QtWidgets.QDialog):
+
+    def __init__(self, client_worker, parent=None):
+        super().__init__(parent)
+
+        self.client_worker = client_worker
+        self.path = ""      # folder being shown
+        self.loaded = 0     # rows recieved so far
+        self.total = 0      # rows in the folder
+        self.waiting = False    # a page request is in flight
+
+        self.setWindowTitle("Server files")
+        self.resize(640, 480)
+
+        # path bar
+        self.up_button = QtWidgets.QPushButton("Up")
+        self.path_input = QtWidgets.QLineEdit()
+        self.go_button = QtWidgets.QPushButton("Go")
+
+        self.path_line = QtWidgets.QHBoxLayout()
+        self.path_line.addWidget(self.up_button)
+        self.path_line.addWidget(self.path_input)
+        self.path_line.addWidget(self.go_button)
+
+        self.search_input = QtWidgets.QLineEdit()
+        self.search_input.setPlaceholderText("Search names in this folder...")
+
+        # file table
+        self.table = QtWidgets.QTableWidget(0, 3)
+        self.table.setHorizontalHeaderLabels(["Name", "Size", "Modified"])
+        self.table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.table.horizontalHeader().setSectionResizeMode(0, QtWidgets.QHeaderView.Stretch)
+
+        self.status = QtWidgets.QLabel("Loading...")
+        self.download_button = QtWidgets.QPushButton("Download")
+
+        self.bottom_line = QtWidgets.QHBoxLayout()
+        self.bottom_line.addWidget(self.status)
+        self.bottom_line.addStretch()
+        self.bottom_line.addWidget(self.download_button)
+
+        # page layout
+        self.layout = QtWidgets.QVBoxLayout(self)
+        self.layout.addLayout(self.path_line)
+        self.layout.addWidget(self.search_input)
+        self.layout.addWidget(self.table)
+        self.layout.addLayout(self.bottom_line)
+
+        # wait for typing to pause before searching
+        self.search_timer = QtCore.QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(300)
+
+        # connect signals
+        self.up_button.clicked.connect(self.go_up)
+        self.go_button.clicked.connect(lambda: self.open_folder(self.path_input.text().strip()))
+        self.path_input.returnPressed.connect(lambda: self.open_folder(self.path_input.text().strip()))
+        self.search_input.textEdited.connect(lambda _: self.search_timer.start())
+        self.search_timer.timeout.connect(self.run_search)
+        self.table.itemDoubleClicked.connect(self.open_item)
+        self.table.verticalScrollBar().valueChanged.connect(self.maybe_load_more)
+        self.download_button.clicked.connect(self.download_selected)
+
+        self.client_worker.browseResult.connect(self.show_page)
+        self.client_worker.searchResult.connect(self.show_search)
+
+        self.open_folder("~")   # start in the server user's home folder
+
+    def done(self, result):
+        # stop listening to the worker once closed
+        self.client_worker.browseResult.disconnect(self.show_page)
+        self.client_worker.searchResult.disconnect(self.show_search)
+        super().done(result)
+
+    def open_folder(self, path: str):
+        self.search_input.clear()
+        self.status.setText("Loading...")
+        self.client_worker.browse(path)
+
+    def go_up(self):
+        parent = self.path_input.property("parent") or ""
+        self.open_folder(parent)
+
+    # fetch the next page when scrolled to the bottom
+    def maybe_load_more(self, value: int):
+        bar = self.table.verticalScrollBar()
+        if value == bar.maximum() and self.loaded < self.total and not self.waiting and not self.search_input.text():
+            self.waiting = True
+            self.client_worker.browse(self.path, self.loaded)
+
+    def run_search(self):
+        prefix = self.search_input.text().strip()
+        if prefix:
+            self.client_worker.search_files(self.path, prefix)
+        else:
+            self.open_folder(self.path)
+
+    def add_row(self, name: str, path: str, is_dir: bool, size: int | None, mtime: int | None):
+
+        row = self.table.rowCount()
+        self.table.insertRow(row)
+
+        name_item = QtWidgets.QTableWidgetItem(name + ("/" if is_dir and not name.endswith(("/", "\\")) else ""))
+        name_item.setData(QtCore.Qt.UserRole, (path, is_dir))
+        self.table.setItem(row, 0, name_item)
+
+        size_text = "" if is_dir or size is None else human_size(size)
+        time_text = time.strftime("%Y-%m-%d %H:%M", time.localtime(mtime)) if mtime else ""
+        self.table.setItem(row, 1, QtWidgets.QTableWidgetItem(size_text))
+        self.table.setItem(row, 2, QtWidgets.QTableWidgetItem(time_text))
+
+    @QtCore.Slot(dict)
+    def show_page(self, page: dict):
+
+        self.waiting = False
+
+        if page.get("error"):
+            self.status.setText(page["error"])
+            return
+
+        # first page of a new folder
+        if page.get("offset", 0) == 0:
+            self.table.setRowCount(0)
+            self.path = page.get("path", "")
+            self.path_input.setText(self.path)
+            self.path_input.setProperty("parent", page.get("parent", ""))
+            self.loaded = 0
+
+        for entry in page.get("entries", []):
+            self.add_row(entry["name"], entry["path"], entry["dir"], entry.get("size"), entry.get("mtime"))
+
+        self.loaded += len(page.get("entries", []))
+        self.total = page.get("total", 0)
+        self.status.setText(f"{self.total} items")
+
+    @QtCore.Slot(dict)
+    def show_search(self, result: dict):
+
+        # ignore replies to older searches
+        if result.get("prefix") != self.search_input.text().strip():
+            return
+
+        self.table.setRowCount(0)
+        for entry in result.get("results", []):
+            self.add_row(entry["path"], entry["path"], entry["dir"], None, None)
+
+        self.status.setText(f"{self.table.rowCount()} matches")
+
+    def open_item(self, item):
+        path, is_dir = self.table.item(item.row(), 0).data(QtCore.Qt.UserRole)
+        if is_dir:
+            self.open_folder(path)
+        else:
+            self.download_selected()
+
+    def download_selected(self):
+
+        row = self.table.currentRow()
+        if row < 0:
+            return
+
+        path, is_dir = self.table.item(row, 0).data(QtCore.Qt.UserRole)
+        if is_dir:
+            self.open_folder(path)
+            return
+
+        self.client_worker.request_file(path)
+        self.accept()
 
 
 # page for running server function
 class ServerPage(QtWidgets.QWidget):
+    sessionEnded = QtCore.Signal()  # server_program returned, the page goes back to stopped
+
     def __init__(self, stacked_widget):
         super().__init__()
 
@@ -311,6 +754,13 @@ class ServerPage(QtWidgets.QWidget):
 
         self.status = QtWidgets.QLabel("Server is stopped.", alignment=QtCore.Qt.AlignCenter)
 
+        # live upload counters per traffic class
+        self.link_label = QtWidgets.QLabel(alignment=QtCore.Qt.AlignCenter)
+        self.link_label.setStyleSheet("color:#888;")
+        self.link_timer = QtCore.QTimer(self)
+        self.link_timer.timeout.connect(self.update_link_label)
+        self.link_timer.start(1000)
+
         # align start and stop buttons
         self.button_line = QtWidgets.QHBoxLayout()
         self.button_line.addWidget(self.start_button)
@@ -320,17 +770,28 @@ class ServerPage(QtWidgets.QWidget):
         self.layout = QtWidgets.QVBoxLayout(self)
         self.layout.addWidget(self.back_button, alignment = QtCore.Qt.AlignRight)
         self.layout.addWidget(self.status)
+        self.layout.addWidget(self.link_label)
+        self.layout.addWidget(StatsPanel())
         self.layout.addLayout(self.button_line) 
 
         # button presses
         self.back_button.clicked.connect(lambda: stacked_widget.setCurrentIndex(0))
         self.start_button.clicked.connect(self.start_server)
         self.stop_button.clicked.connect(self.stop_server)
+        self.sessionEnded.connect(self.server_ended)
         
+    # traffic plus input injection stats once the server has been started
+    def update_link_label(self):
+        text = shaper.summary()
+        if self.server_thread is not None:
+            text += "\n" + server.input_injector.summary()
+        self.link_label.setText(text)
+
     # run server program in seperate thread
     def start_server(self):
 
-        self.server_thread = threading.Thread(target=server.server_program, daemon=True, args=(FPS, SCALE, JPEG_QUALITY))
+        clipboard_bridge()
+        self.server_thread = threading.Thread(target=self.run_server, daemon=True)
         self.server_thread.start()
         self.status.setText("Server listening on 0.0.0.0:5000/5001...")
 
@@ -338,6 +799,16 @@ class ServerPage(QtWidgets.QWidget):
         self.start_button.setEnabled(False)
         self.stop_button.setEnabled(True)
 
+    # one session, thumbnails and discovery answer only while this runs
+    def run_server(self):
+        try:
+            server.server_program(FPS, SCALE, JPEG_QUALITY)
+        finally:
+            # a stop and quick restart already replaced this thread, leave the new session alone
+            if self.server_thread is threading.current_thread():
+                server.stop_server()
+                self.sessionEnded.emit()
+
     def stop_server(self):
 
         server.stop_server()
@@ -353,15 +824,25 @@ class ServerPage(QtWidgets.QWidget):
     # make sure the server has stopped
     def check_server_stopped(self):
 
-        if self.server_thread.is_alive():
+        if self.server_thread is not None and self.server_thread.is_alive():
             QtCore.QTimer.singleShot(1000, self.check_server_stopped)   # wait in between calls
         else:
             self.status.setText("Server is stopped.")
             self.server_thread = None
 
+    # client disconnected (or the server failed), nothing is being served anymore
+    def server_ended(self):
+        self.status.setText("Server is stopped.")
+        self.server_thread = None
+        self.start_button.setEnabled(True)
+        self.stop_button.setEnabled(False)
+
 
 # devices page
 class DevicePage(QtWidgets.QWidget):
+    found = QtCore.Signal(str, str)     # name, ip from a discovery reply
+    localIps = QtCore.Signal(str, str)  # private, public of this device
+
     def __init__(self, stacked_widget):
         super().__init__()
 
@@ -373,20 +854,20 @@ class DevicePage(QtWidgets.QWidget):
 
         self.title = QtWidgets.QLabel("Devices", alignment=QtCore.Qt.AlignCenter)
 
-        # csv table
+        # device table
         self.table = QtWidgets.QTableWidget()
-        self.table.setColumnCount(3)
-        self.table.setHorizontalHeaderLabels(["Hostname", "Private IP", "Public IP"])
+        self.table.setColumnCount(4)
+        self.table.setHorizontalHeaderLabels(["Hostname", "Private IP", "Public IP", "Last seen"])
         header = self.table.horizontalHeader()
         header.setStretchLastSection(True)
         header.setSectionResizeMode(QtWidgets.QHeaderView.Stretch)
 
-        # display local device info
-        self.local_private = self.get_local_private_ip()
-        self.local_public = self.get_local_public_ip()
-        local_private_text = self.local_private if self.local_private else "unknown"
-        local_public_text = self.local_public if self.local_public else "unknown"
-        self.local_label = QtWidgets.QLabel(f"This device - Private: {local_private_text}   Public: {local_public_text}")
+        # display local device info, filled in once the lookups finish
+        self.local_private = None
+        self.local_public = None
+        self.local_label = QtWidgets.QLabel("This device - Private: ...   Public: ...")
+        self.localIps.connect(self.show_local_ips)
+        threading.Thread(target=self.detect_local_ips, daemon=True).start()
 
         self.name_input = QtWidgets.QLineEdit()
         self.private_input = QtWidgets.QLineEdit()
@@ -401,12 +882,14 @@ class DevicePage(QtWidgets.QWidget):
         self.add_button = QtWidgets.QPushButton("Add device")
         self.delete_button = QtWidgets.QPushButton("Remove device")
         self.refresh_button = QtWidgets.QPushButton("Refresh")
+        self.scan_button = QtWidgets.QPushButton("Scan LAN")
 
         buttons_line = QtWidgets.QHBoxLayout()
         buttons_line.addWidget(self.ip_button)
         buttons_line.addWidget(self.add_button)
         buttons_line.addWidget(self.delete_button)
         buttons_line.addWidget(self.refresh_button)
+        buttons_line.addWidget(self.scan_button)
 
         # page layout 
         layout = QtWidgets.QVBoxLayout(self)
@@ -424,28 +907,45 @@ class DevicePage(QtWidgets.QWidget):
         self.delete_button.clicked.connect(self.delete_device)
         self.refresh_button.clicked.connect(self.load_devices)
 
+        # servers on the lan answer discovery probes, replies keep their addresses current
+        self.found.connect(self.device_found)
+        self.discovery = None
+        self.scan_button.clicked.connect(self.scan_lan)
+
         # initial load
         self.load_devices()
 
-    # load info from hosts.csv
+    # load info from the host registry
     def load_devices(self):
         self.table.setRowCount(0)
 
-        if not os.path.exists("hosts.csv"):
-            return
+        for row_idx, host in enumerate(registry.shared().all()):
+            self.table.insertRow(row_idx)
+
+            seen = time.strftime("%Y-%m-%d %H:%M", time.localtime(host["last_seen"])) if host["last_seen"] else ""
+            for col, value in enumerate((host["name"], host["privateip"], host["publicip"], seen)):
+                item = QtWidgets.QTableWidgetItem(value or "")
+                self.table.setItem(row_idx, col, item)
 
-        with open("hosts.csv", newline="") as host_file:
-            reader = csv.DictReader(host_file)
+    # listening starts the first time the page is opened, discovery and encrypt stay unloaded untill then
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.start_discovery()
 
-            for row_idx, row in enumerate(reader):      # get row value and index
-                self.table.insertRow(row_idx)
+    def start_discovery(self):
+        if self.discovery is None:
+            self.discovery = discovery.Listener(on_found=self.found.emit)
+            self.discovery.start()
 
-                for col, key in enumerate(("hostname", "privateip", "publicip")):   
-                    value = row.get(key, "")    # convert key to readable value
-                    item = QtWidgets.QTableWidgetItem(value)
-                    self.table.setItem(row_idx, col, item)
+    def scan_lan(self):
+        self.start_discovery()
+        self.discovery.probe_now()
 
-    # add device to hosts.csv
+    # a discovery reply came in (queued from the listener thread)
+    def device_found(self, name: str, ip: str):
+        self.load_devices()
+
+    # add device to the host registry
     def add_device(self):
 
         # get values from user
@@ -458,19 +958,7 @@ class DevicePage(QtWidgets.QWidget):
             QtWidgets.QMessageBox.warning(self, "Missing hostname", "Enter a hostname.")
             return
 
-        # set value if the csv has not been setup
-        new_file = not os.path.exists("hosts.csv")
-
-        # open or create file
-        with open("hosts.csv", "a", newline="") as host_file:
-            writer = csv.writer(host_file)
-
-            # add headder
-            if new_file:
-                writer.writerow(["hostname", "privateip", "publicip"])
-            
-            # write inputed values
-            writer.writerow([name, private_ip, public_ip])
+        registry.shared().add(name, private_ip, public_ip)
 
         # clear and load inputs
         self.name_input.clear()
@@ -478,7 +966,7 @@ class DevicePage(QtWidgets.QWidget):
         self.public_input.clear()
         self.load_devices()
 
-    # delete device from hosts.csv
+    # delete device from the host registry
     def delete_device(self):
 
         # get selected name from menue
@@ -498,34 +986,10 @@ class DevicePage(QtWidgets.QWidget):
             QtWidgets.QMessageBox.warning(self, "Missing hostname", "Enter a hostname to remove.")
             return
 
-        if not os.path.exists("hosts.csv"):
-            QtWidgets.QMessageBox.warning(self, "No hosts detected.")
-            return
-
-        kept_rows = []     # store rows to be kept
-        removed = False
-
-        # cycle through rows and mark for removal
-        with open("hosts.csv", newline="") as host_file:
-            reader = csv.DictReader(host_file)
-            fieldnames = reader.fieldnames or ["hostname", "privateip", "publicip"]
-
-            for row in reader:
-                if row.get("hostname", "").strip() == name:
-                    removed = True
-                else:
-                    kept_rows.append(row)
-
-        if not removed:
+        if not registry.shared().remove(name):
             QtWidgets.QMessageBox.information(self, "Not found", f"No entry found with hostname '{name}'.")
             return
 
-        # write back kept rows
-        with open("hosts.csv", "w", newline="") as host_file:
-            writer = csv.DictWriter(host_file, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(kept_rows)
-
         # refresh table
         self.load_devices()
         self.name_input.clear()
@@ -535,6 +999,15 @@ class DevicePage(QtWidgets.QWidget):
         QtWidgets.QMessageBox.information(self, "Removed", f"Device '{name}' has been removed.")
 
 
+    # runs on a background thread, the public ip lookup can take seconds
+    def detect_local_ips(self):
+        self.localIps.emit(self.get_local_private_ip() or "", self.get_local_public_ip() or "")
+
+    def show_local_ips(self, private_ip: str, public_ip: str):
+        self.local_private = private_ip or None
+        self.local_public = public_ip or None
+        self.local_label.setText(f"This device - Private: {private_ip or 'unknown'}   Public: {public_ip or 'unknown'}")
+
     # populate ip fields
     def fill_local_ips(self):
         self.private_input.setText(self.local_private or "")
@@ -557,6 +1030,7 @@ class DevicePage(QtWidgets.QWidget):
     # not implemented 
     @staticmethod
     def get_local_public_ip() -> str:
+        from urllib.request import urlopen
         try:
             with urlopen("https://api.ipify.org", timeout=3) as resp:
                 return resp.read().decode("utf-8").strip()
@@ -596,9 +1070,27 @@ class SettingsPage(QtWidgets.QWidget):
         self.fps_spin.setRange(5, 60)
         self.fps_spin.setSingleStep(5)  # ammount the arrows move value
 
+        # upload shaping, input always goes first, video keeps its minimum, files get the rest
+        self.limit_spin = QtWidgets.QSpinBox()
+        self.limit_spin.setRange(0, 1000)
+        self.limit_spin.setSpecialValueText("No limit")
+        self.limit_spin.setSuffix(" Mbit/s")
+        self.limit_spin.setValue(UPLOAD_LIMIT)
+
+        self.video_min_spin = QtWidgets.QSpinBox()
+        self.video_min_spin.setRange(0, 1000)
+        self.video_min_spin.setSuffix(" Mbit/s")
+        self.video_min_spin.setValue(VIDEO_MIN)
+
+        # prometheus endpoint for scraping
+        self.metrics_check = QtWidgets.QCheckBox("Serve metrics on http://127.0.0.1:9105/metrics")
+
         form = QtWidgets.QFormLayout()
         form.addRow("Resolution scale:", self.resolution_menue)
         form.addRow("Framerate (FPS):", self.fps_spin)
+        form.addRow("Upload limit:", self.limit_spin)
+        form.addRow("Video minimum:", self.video_min_spin)
+        form.addRow("Metrics:", self.metrics_check)
 
         self.save_button = QtWidgets.QPushButton("Save")
 
@@ -616,7 +1108,7 @@ class SettingsPage(QtWidgets.QWidget):
     # update settings with user input
     def apply_settings(self):
 
-        global FPS, SCALE, JPEG_QUALITY # use global values
+        global FPS, SCALE, JPEG_QUALITY, UPLOAD_LIMIT, VIDEO_MIN # use global values
 
         # get user input 
         _, scale = self.resolution_options[self.resolution_menue.currentIndex()]
@@ -625,8 +1117,214 @@ class SettingsPage(QtWidgets.QWidget):
         # update values
         SCALE = float(scale)
         FPS = int(fps)
+        UPLOAD_LIMIT = self.limit_spin.value()
+        VIDEO_MIN = self.video_min_spin.value()
+
+        # the endpoint stays up once started, untill the app closes
+        if self.metrics_check.isChecked():
+            try:
+                metrics.serve()
+            except OSError as e:
+                QtWidgets.QMessageBox.warning(self, "Metrics", f"Could not serve metrics: {e}")
+
+        # link sharing applies straight away (Mbit/s -> bytes/s)
+        shaper.configure(UPLOAD_LIMIT * 125_000, video_min=VIDEO_MIN * 125_000, input_min=32_000)
+
+        # a running server switches over before its next frame
+        if is_loaded(server) and server.server_running:
+            server.stream_settings.update({"fps": FPS, "scale": SCALE})
+            QtWidgets.QMessageBox.information(self, "Settings saved", "New settings applied to the running server.")
+        else:
+            QtWidgets.QMessageBox.information(self, "Settings saved", "New settings will be applied on next server start.")
+
+
+# connects the system clipboard to clipsync, shared by the client and server pages
+class ClipboardBridge(QtCore.QObject):
+    applyRemote = QtCore.Signal(str, bytes)     # emitted from network threads, handled on the ui thread
+
+    def __init__(self, clipboard, parent=None):
+        super().__init__(parent)
+        self.clipboard = clipboard
+        self.ignore_until = 0.0     # our own setText / setImage also fires dataChanged
+
+        self.applyRemote.connect(self.apply)
+        self.clipboard.dataChanged.connect(self.changed)
+        clipsync.set_backend(self.applyRemote.emit)
+
+    def changed(self):
+
+        if time.monotonic() < self.ignore_until:
+            return
+
+        mime = self.clipboard.mimeData()
+        if mime is None:
+            return
+
+        # hashing, compressing and png encoding happen off the ui thread
+        if mime.hasImage():
+            img = QtGui.QImage(self.clipboard.image())
+            threading.Thread(target=self.share_image, args=(img,), daemon=True).start()
+        elif mime.hasText():
+            text = self.clipboard.text()
+            threading.Thread(target=clipsync.local_changed, args=("text", text.encode("utf-8")), daemon=True).start()
+
+    def share_image(self, img: QtGui.QImage):
+        data = QtCore.QByteArray()
+        buf = QtCore.QBuffer(data)
+        buf.open(QtCore.QIODevice.WriteOnly)
+        img.save(buf, "PNG")
+        clipsync.local_changed("image", bytes(data))
+
+    def apply(self, kind: str, data: bytes):
+        self.ignore_until = time.monotonic() + 0.5
+        if kind == "text":
+            self.clipboard.setText(data.decode("utf-8", "replace"))
+        else:
+            self.clipboard.setImage(QtGui.QImage.fromData(data, "PNG"))
+
+
+_clipboard_bridge = None
+
+# made by the first session (clipboard sharing only matters with a peer), clipsync loads with it
+def clipboard_bridge() -> ClipboardBridge:
+    global _clipboard_bridge
+    if _clipboard_bridge is None:
+        _clipboard_bridge = ClipboardBridge(QtWidgets.QApplication.clipboard())
+    return _clipboard_bridge
+
+
+# one machine on the dashboard, click to open a full session
+class HostTile(QtWidgets.QFrame):
+    clicked = QtCore.Signal(str)
+
+    def __init__(self, name: str, parent=None):
+        super().__init__(parent)
+        self.name = name
+        self.setFrameShape(QtWidgets.QFrame.StyledPanel)
+        self.setCursor(QtCore.Qt.PointingHandCursor)
+
+        self.image = QtWidgets.QLabel("No preview yet")
+        self.image.setFixedSize(320, 180)
+        self.image.setAlignment(QtCore.Qt.AlignCenter)
+        self.image.setStyleSheet("background:#111; color:#888;")
 
-        QtWidgets.QMessageBox.information(self, "Settings saved", "New settings will be applied on next server start.")
+        self.title = QtWidgets.QLabel(name)
+        self.title.setStyleSheet("font-weight: bold;")
+        self.status = QtWidgets.QLabel("Waiting ...")
+        self.status.setStyleSheet("color:#888;")
+
+        self.layout = QtWidgets.QVBoxLayout(self)
+        self.layout.addWidget(self.image)
+        self.layout.addWidget(self.title)
+        self.layout.addWidget(self.status)
+
+    def set_thumbnail(self, jpeg: bytes):
+        img = QtGui.QImage.fromData(jpeg, "JPG")
+        if img.isNull():
+            return
+        pix = QtGui.QPixmap.fromImage(img).scaled(self.image.size(), QtCore.Qt.KeepAspectRatio,
+                                                  QtCore.Qt.SmoothTransformation)
+        self.image.setPixmap(pix)
+        self.status.setText(f"Online, updated {time.strftime('%H:%M:%S')}")
+
+    def set_status(self, text: str):
+        self.status.setText(text)
+
+    def mousePressEvent(self, event):
+        if event.button() == QtCore.Qt.LeftButton:
+            self.clicked.emit(self.name)
+
+
+# live previews of every known device, streams only while the page is shown
+class DashboardPage(QtWidgets.QWidget):
+
+    def __init__(self, stacked_widget, client_page):
+        super().__init__()
+
+        self.stacked_widget = stacked_widget
+        self.client_page = client_page
+        self.mux = None
+        self.tiles = {}
+
+        self.back_button = QtWidgets.QPushButton("Back")
+        self.back_button.setFixedSize(80, 30)
+        self.info = QtWidgets.QLabel("Click a device to open a full session.")
+
+        # tile grid in a scroll area
+        self.grid_holder = QtWidgets.QWidget()
+        self.grid = QtWidgets.QGridLayout(self.grid_holder)
+        self.grid.setAlignment(QtCore.Qt.AlignTop | QtCore.Qt.AlignLeft)
+        self.scroll = QtWidgets.QScrollArea()
+        self.scroll.setWidgetResizable(True)
+        self.scroll.setWidget(self.grid_holder)
+
+        # page layout
+        self.layout = QtWidgets.QVBoxLayout(self)
+        self.layout.addWidget(self.back_button, alignment = QtCore.Qt.AlignRight)
+        self.layout.addWidget(self.info)
+        self.layout.addWidget(self.scroll)
+
+        self.back_button.clicked.connect(lambda: stacked_widget.setCurrentIndex(0))
+
+    # host list is reloaded each time so device page edits show up
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.start_dashboard()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.stop_dashboard()
+
+    def start_dashboard(self):
+
+        self.stop_dashboard()
+
+        for tile in self.tiles.values():
+            tile.deleteLater()
+        self.tiles = {}
+
+        hosts = client.known_hosts()
+        if not hosts:
+            self.info.setText("No devices yet, add or scan for some on the Devices page.")
+            return
+        self.info.setText("Click a device to open a full session.")
+
+        columns = max(1, self.scroll.viewport().width() // 340)
+        for i, name in enumerate(hosts):
+            tile = HostTile(name)
+            tile.clicked.connect(self.open_session)
+            self.grid.addWidget(tile, i // columns, i % columns)
+            self.tiles[name] = tile
+
+        # one thread services every connection
+        self.mux = client.ThumbnailMux(hosts)
+        self.mux.thumbReady.connect(self.show_thumbnail)
+        self.mux.linkState.connect(self.show_link_state)
+        self.mux.start()
+
+    def stop_dashboard(self):
+        if self.mux is not None:
+            self.mux.stop()
+            self.mux = None
+
+    def show_thumbnail(self, name: str, jpeg: bytes):
+        tile = self.tiles.get(name)
+        if tile:
+            tile.set_thumbnail(jpeg)
+
+    def show_link_state(self, name: str, text: str):
+        tile = self.tiles.get(name)
+        if tile:
+            tile.set_status(text)
+
+    # upgrade a tile to a full rate session on the client page
+    def open_session(self, name: str):
+        worker = getattr(self.client_page, "client_worker", None)
+        if worker is not None and worker.client_running:
+            worker.stop()   # one full session at a time
+        self.client_page.set_host.setText(name)
+        self.stacked_widget.setCurrentIndex(1)
+        self.client_page.start_client()
 
 
 # main page
@@ -642,9 +1340,12 @@ class MainMenu(QtWidgets.QWidget):
         self.device_button.setFixedSize(80, 30)
         self.help_button = QtWidgets.QPushButton("Help")
         self.help_button.setFixedSize(80, 30)
+        self.dashboard_button = QtWidgets.QPushButton("Dashboard")
+        self.dashboard_button.setFixedSize(80, 30)
 
         self.top_line = QtWidgets.QHBoxLayout()
         self.top_line.addStretch()
+        self.top_line.addWidget(self.dashboard_button)
         self.top_line.addWidget(self.help_button)
         self.top_line.addWidget(self.device_button)
         self.top_line.addWidget(self.settings_button)
@@ -679,6 +1380,7 @@ class MainMenu(QtWidgets.QWidget):
         self.server_button.clicked.connect(lambda: stacked_widget.setCurrentIndex(2))
         self.device_button.clicked.connect(lambda: stacked_widget.setCurrentIndex(3))
         self.settings_button.clicked.connect(lambda: stacked_widget.setCurrentIndex(4))
+        self.dashboard_button.clicked.connect(lambda: stacked_widget.setCurrentIndex(5))
         self.help_button.clicked.connect(self.help_display)
 
 
@@ -702,6 +1404,9 @@ class MainMenu(QtWidgets.QWidget):
 
 
 if __name__ == "__main__":
+    # server and discovery messages go to the console
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
     # define app
     app = QtWidgets.QApplication([])
 
@@ -711,6 +1416,7 @@ if __name__ == "__main__":
     server_page = ServerPage(stacked_widget)
     device_page = DevicePage(stacked_widget)
     settings_page = SettingsPage(stacked_widget)
+    dashboard_page = DashboardPage(stacked_widget, client_page)
 
     # pages 
     stacked_widget.addWidget(main_menu)     # 0
@@ -718,9 +1424,17 @@ if __name__ == "__main__":
     stacked_widget.addWidget(server_page)   # 2
     stacked_widget.addWidget(device_page)   # 3
     stacked_widget.addWidget(settings_page) # 4
+    stacked_widget.addWidget(dashboard_page)    # 5
 
     stacked_widget.setCurrentIndex(0)   # start on main_menue page
     stacked_widget.resize(800, 600)
     stacked_widget.show()
 
+    # bench_startup.py launches us with this set, report once the window is up and quit
+    if os.environ.get("RPC_STARTUP_BENCH"):
+        def first_window():
+            print(f"first window {time.perf_counter() - STARTED:.3f}s", flush=True)
+            app.quit()
+        QtCore.QTimer.singleShot(0, first_window)
+
     sys.exit(app.exec())
\ No newline at end of file
@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+import statistics
+import subprocess
+
+# time to first window of UI.py, and what each subsystem costs to import
+# usage: python bench_startup.py [runs]     (set QT_QPA_PLATFORM=offscreen on a headless machine)
+
+RUNS = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+MODULES = ("PySide6.QtWidgets", "shaper", "registry", "encrypt", "discovery", "client", "server")
+OUTPUT = "bench_output.txt"
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+
+# wall time from launch untill UI.py reports its first window, plus the in process time it reports
+def launch_once() -> tuple:
+
+    env = dict(os.environ, RPC_STARTUP_BENCH="1")
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "UI.py"], cwd=here, env=env,
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+
+    for line in proc.stdout:
+        if line.startswith("first window"):
+            wall = time.perf_counter() - start
+            proc.wait(timeout=30)
+            return wall, float(line.split()[2].rstrip("s"))
+
+    proc.wait()
+    raise RuntimeError(f"UI.py exited with {proc.returncode} before showing a window")
+
+
+# import time of one module in a fresh interpreter
+def import_time(name: str) -> float | None:
+
+    code = f"import time; t = time.perf_counter(); import {name}; print(time.perf_counter() - t)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=here, capture_output=True, text=True)
+    if result.returncode != 0:
+        return None     # dependency missing on this machine
+    return float(result.stdout.strip())
+
+
+def main():
+
+    lines = [f"startup benchmark {time.strftime('%Y-%m-%d %H:%M:%S')}  python {sys.version.split()[0]}"]
+
+    try:
+        runs = [launch_once() for _ in range(RUNS)]
+        walls = [w for w, _ in runs]
+        inside = [i for _, i in runs]
+        lines.append(f"first window   median {statistics.median(walls):.3f}s   min {min(walls):.3f}s   "
+                     f"(in process {statistics.median(inside):.3f}s)   {RUNS} runs")
+    except Exception as e:
+        lines.append(f"first window   failed: {e}")
+
+    for name in MODULES:
+        t = import_time(name)
+        lines.append(f"import {name:<18} " + (f"{t * 1000:8.1f} ms" if t is not None else "  unavailable"))
+
+    text = "\n".join(lines)
+    print(text)
+    with open(os.path.join(here, OUTPUT), "a") as f:
+        f.write(text + "\n\n")
+
+
+if __name__ == "__main__":
+    main()
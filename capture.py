@@ -0,0 +1,300 @@
+import os
+import sys
+import time
+import signal
+import logging
+import threading
+import subprocess
+from multiprocessing import shared_memory, resource_tracker
+from multiprocessing.connection import Listener, Client
+
+import numpy as np
+import cv2
+import mss
+
+import framecodec
+
+log = logging.getLogger("remotepc.capture")
+
+# screen capture and encoding in a worker process, so the numpy / opencv work has its own core and never
+# waits on the gil with the ui, the network or input injection
+#
+# the worker is this file run as a script (python capture.py <address> <shm name> <shm bytes>), a plain
+# subprocess that imports only what capture needs, whichever script started the parent. it connects back
+# to a local listener with a one time key it reads from stdin, giving a multiprocessing connection
+#
+# the parent owns one shared memory buffer and asks for one frame at a time over that connection:
+#   parent -> worker    ("grab", settings)      settings: scale, quality, codec, keyframe, cache
+#                       ("stop",)
+#   worker -> parent    ("frame", length, info)     encoded frame is in the buffer (length 0 = encode failed)
+#                       ("big", data, info)         too big for the buffer, came over the pipe instead
+#                       ("error", message)
+#   info: frame and screen size, capture and encode seconds, framecodec counter changes since the last frame
+#
+# frames are captured only when the video loop asks (it has a credit and the fps allows it), capturing the
+# next one while this one is sent would show the client a screen that is a frame older, so one buffer is enough
+# and the parent copies out of it before asking again
+# if the worker cannot be started (no shared memory, frozen build with no python to run this file) capture runs inline
+
+SHM_BYTES = 8 * 1024 * 1024     # a keyframe of a busy 4k screen fits, bigger ones go over the pipe
+POLL = 0.5                      # seconds between checks that the worker is still alive while waiting
+START_TIMEOUT = 15.0            # seconds for a new worker to connect back (cv2 and numpy load first)
+
+# framecodec counters the worker reports back, it has its own copy of the metrics
+COUNTERS = ("copies_sent", "keyframes_sent", "text_rects", "refined_tiles", "cache_hits")
+
+
+# get screen frame to send, scaled bgr
+def screen_grab(sct, mon, scale: float):
+
+    img = np.array(sct.grab(mon))
+    frame = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
+
+    # downscale
+    if scale != 1.0:
+        h, w = frame.shape[:2]
+        frame = cv2.resize(frame, (int(w*scale), int(h*scale)), interpolation=cv2.INTER_AREA)
+
+    return frame
+
+
+# capture and encode one frame with the settings of a grab request, returns (data or None, info)
+def capture_one(sct, mon, encoder: framecodec.FrameEncoder, settings: dict):
+
+    if settings.get("cache") is not None:
+        encoder.set_cache_size(settings["cache"])
+    if settings.get("keyframe"):
+        encoder.request_keyframe()
+
+    t0 = time.perf_counter()
+    frame = screen_grab(sct, mon, settings["scale"])
+    t1 = time.perf_counter()
+    data = encoder.encode(frame, settings["quality"], settings["codec"])
+    t2 = time.perf_counter()
+
+    info = {"w": frame.shape[1], "h": frame.shape[0], "screen_w": mon["width"], "screen_h": mon["height"],
+            "capture": t1 - t0, "encode": t2 - t1}
+    return data, info
+
+
+def worker_main(conn, shm_name: str, shm_bytes: int):
+
+    # ctrl+c reaches the whole process group, the parent decides when this stops
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    shm = attach_shm(shm_name)
+    encoder = framecodec.FrameEncoder()
+    reported = {name: 0 for name in COUNTERS}
+
+    try:
+        with mss.mss() as sct:
+            mon = sct.monitors[1]   # primary display
+
+            while True:
+                msg = conn.recv()
+                if msg[0] == "stop":
+                    break
+                settings = msg[1]
+
+                data, info = capture_one(sct, mon, encoder, settings)
+
+                # counters moved by this frame
+                info["counters"] = {}
+                for name in COUNTERS:
+                    value = getattr(framecodec, name).value
+                    if value != reported[name]:
+                        info["counters"][name] = value - reported[name]
+                        reported[name] = value
+
+                if data is None:
+                    conn.send(("frame", 0, info))
+                elif len(data) > shm_bytes:
+                    conn.send(("big", data, info))
+                else:
+                    shm.buf[:len(data)] = data
+                    conn.send(("frame", len(data), info))
+
+    except (EOFError, OSError):
+        pass    # parent went away
+    except Exception as e:
+        try:
+            conn.send(("error", repr(e)))
+        except OSError:
+            pass
+    finally:
+        shm.close()
+
+
+# the parent created the buffer and unlinks it, the worker's own resource tracker must not (before python 3.13
+# attaching registers the buffer, and the tracker removes it with a warning when the worker exits)
+def attach_shm(name: str):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        if os.name == "posix":
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+# entry point of the worker process
+def worker_entry(argv):
+
+    address, shm_name, shm_bytes = argv[0], argv[1], int(argv[2])
+    authkey = bytes.fromhex(sys.stdin.readline().strip())
+    conn = Client(address, authkey=authkey)
+    try:
+        worker_main(conn, shm_name, shm_bytes)
+    finally:
+        conn.close()
+
+
+# the parent's side, one per server, started for each session
+class CaptureWorker:
+
+    def __init__(self):
+        self.proc = None
+        self.conn = None
+        self.shm = None
+        self.inline = False     # capturing in this process, the worker could not be started
+        self.sct = None
+        self.encoder = None
+        self.want_key = False   # set from the control thread, sent with the next grab
+        self.cache = None       # tile cache size waiting to be sent with the next grab
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+
+        self.stop()
+        self.want_key = False
+        self.cache = None
+
+        try:
+            if getattr(sys, "frozen", False):
+                raise RuntimeError("frozen build")
+            self.shm = shared_memory.SharedMemory(create=True, size=SHM_BYTES)
+            self.conn = self.launch()
+            self.inline = False
+            log.info(f"Capture worker started, pid {self.proc.pid}")
+        except Exception as e:
+            log.warning(f"Capture worker not started, capturing in process: {e}")
+            self.stop()
+            self.inline = True
+
+    # run the worker script and wait for it to connect back, returns the connection
+    def launch(self):
+
+        authkey = os.urandom(32)
+        with Listener(authkey=authkey) as listener:
+            self.proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), listener.address,
+                                          self.shm.name, str(SHM_BYTES)], stdin=subprocess.PIPE)
+            self.proc.stdin.write(authkey.hex().encode() + b"\n")
+            self.proc.stdin.close()
+
+            # accept has no timeout, it waits on a helper thread while the worker is watched from here
+            accepted = []
+            waiter = threading.Thread(target=lambda: accepted.append(listener.accept()), daemon=True)
+            waiter.start()
+            deadline = time.monotonic() + START_TIMEOUT
+            while waiter.is_alive() and self.proc.poll() is None and time.monotonic() < deadline:
+                waiter.join(0.1)
+
+        if not accepted:
+            raise RuntimeError("worker did not connect" if self.proc.poll() is None
+                               else f"worker exited with code {self.proc.returncode}")
+        return accepted[0]
+
+    def stop(self):
+
+        if self.proc is not None:
+            try:
+                self.conn.send(("stop",))
+            except (OSError, AttributeError):
+                pass    # never connected
+            try:
+                self.proc.wait(2.0)
+            except subprocess.TimeoutExpired:
+                self.proc.terminate()
+                try:
+                    self.proc.wait(1.0)
+                except subprocess.TimeoutExpired:
+                    self.proc.kill()
+            self.proc = None
+
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+        if self.sct is not None:
+            self.sct.close()
+            self.sct = None
+        self.encoder = None
+
+    # next frame redraws the whole canvas
+    def request_keyframe(self):
+        self.want_key = True
+
+    def set_cache_size(self, tiles: int):
+        self.cache = tiles
+
+    # capture and encode one frame, returns (data, info), data is None if encoding failed
+    # raises RuntimeError if the worker died, running() is checked while waiting
+    def grab(self, settings: dict, running=lambda: True):
+
+        settings = dict(settings, keyframe=self.want_key, cache=self.cache)
+        self.want_key = False
+        self.cache = None
+
+        if self.inline:
+            return self.grab_inline(settings)
+
+        try:
+            self.conn.send(("grab", settings))
+            while not self.conn.poll(POLL):
+                if self.proc.poll() is not None:
+                    break
+                if not running():
+                    return None, None
+            msg = self.conn.recv()
+        except (EOFError, OSError):
+            try:
+                self.proc.wait(1.0)
+            except subprocess.TimeoutExpired:
+                pass
+            raise RuntimeError(f"Capture worker exited with code {self.proc.returncode}")
+
+        if msg[0] == "error":
+            raise RuntimeError(f"Capture worker failed: {msg[1]}")
+
+        if msg[0] == "big":
+            _, data, info = msg
+        else:
+            _, length, info = msg
+            data = bytes(self.shm.buf[:length]) if length else None
+
+        for name, n in info.pop("counters", {}).items():
+            getattr(framecodec, name).inc(n)
+        return data, info
+
+    def grab_inline(self, settings: dict):
+
+        # mss handles belong to the thread that made them, so this is created by the video thread
+        if self.sct is None:
+            self.sct = mss.mss()
+            self.encoder = framecodec.FrameEncoder()
+        return capture_one(self.sct, self.sct.monitors[1], self.encoder, settings)
+
+
+if __name__ == "__main__":
+    worker_entry(sys.argv[1:])
@@ -0,0 +1,220 @@
+import os
+import json
+import hashlib
+import threading
+import numpy as np
+
+from collections import OrderedDict
+
+
+CACHE_DIR = "chunk_cache"
+CACHE_BYTES = 1024 * 1024 * 1024    # 1 GiB in total, one store is shared by every peer
+
+# content defined chunking sizes
+MIN_CHUNK = 16 * 1024
+MAX_CHUNK = 256 * 1024
+CUT_MASK = (1 << 16) - 1    # ~64 KiB average chunk
+WINDOW = 48                 # bytes in the rolling hash window
+
+READ_SIZE = 8 * 1024 * 1024     # bytes searched for cut points at a time
+
+# fixed random table so both ends cut in the same places
+GEAR = np.random.RandomState(0x52435043).randint(0, 2**32, size=256, dtype=np.uint64)
+
+
+# content hash used as the chunk address
+def chunk_hash(data) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+# offsets in buf where a chunk is allowed to end (hash of the last WINDOW bytes hits the mask)
+def cut_candidates(buf) -> np.ndarray:
+
+    if len(buf) <= WINDOW:
+        return np.empty(0, dtype=np.int64)
+
+    # moving sum of gear values is a rolling hash that only depends on the window contents
+    sums = np.cumsum(GEAR[np.frombuffer(buf, dtype=np.uint8)], dtype=np.uint64)
+    rolling = sums[WINDOW:] - sums[:-WINDOW]
+
+    return np.nonzero((rolling & CUT_MASK) == 0)[0] + WINDOW + 1
+
+
+# pick chunk end offsets from the candidates, respecting min and max sizes
+def split(buf, final: bool) -> list[int]:
+
+    cands = cut_candidates(buf)
+    ends = []
+    start = 0
+
+    while start < len(buf):
+
+        # first candidate past the minimum size
+        i = np.searchsorted(cands, start + MIN_CHUNK)
+
+        if i < len(cands) and cands[i] <= start + MAX_CHUNK:
+            end = int(cands[i])
+        elif start + MAX_CHUNK <= len(buf):
+            end = start + MAX_CHUNK
+        elif final:
+            end = len(buf)
+        else:
+            break   # need more data to decide
+
+        ends.append(end)
+        start = end
+
+    return ends
+
+
+# yield (offset, view) for the content defined chunks of a buffer (ie: a mapped file)
+def iter_chunks(view):
+
+    pos = 0
+    total = len(view)
+
+    # cut points are found a window at a time so memory stays bounded on huge files
+    while pos < total:
+        window = view[pos:pos + READ_SIZE]
+        final = pos + len(window) >= total
+
+        start = 0
+        for end in split(window, final=final):
+            yield pos + start, view[pos + start:pos + end]
+            start = end
+
+        pos += start
+
+
+# size bounded, least recently used store of chunks on disk
+class ChunkStore:
+
+    def __init__(self, root: str = CACHE_DIR, max_bytes: int = CACHE_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()    # hash -> size, oldest first
+        self.pins = {}                  # hash -> count, pinned chunks are never evicted
+        self.total = 0
+        self.load()
+
+    def path_for(self, h: str) -> str:
+        return os.path.join(self.root, h[:2], h)
+
+    def load(self):
+
+        index = os.path.join(self.root, "index.json")
+        if not os.path.exists(index):
+            return
+
+        try:
+            with open(index) as f:
+                for h, size in json.load(f):
+                    self.entries[h] = size
+                    self.total += size
+        except (OSError, ValueError):
+            # corrupt index, start over (files are cleaned by eviction later)
+            self.entries.clear()
+            self.total = 0
+
+    # write the lru order back to disk
+    def flush(self):
+
+        with self.lock:
+            items = list(self.entries.items())
+
+        os.makedirs(self.root, exist_ok=True)
+        tmp = os.path.join(self.root, "index.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(items, f)
+        os.replace(tmp, os.path.join(self.root, "index.json"))
+
+    def has(self, h: str) -> bool:
+        with self.lock:
+            return h in self.entries and os.path.exists(self.path_for(h))
+
+    def get(self, h: str) -> bytes | None:
+
+        with self.lock:
+            if h not in self.entries:
+                return None
+            self.entries.move_to_end(h)     # mark as recently used
+
+        try:
+            with open(self.path_for(h), "rb") as f:
+                return f.read()
+        except OSError:
+            self.discard(h)
+            return None
+
+    def put(self, h: str, data):
+
+        with self.lock:
+            if h in self.entries:
+                self.entries.move_to_end(h)
+                return
+
+        path = self.path_for(h)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # write then rename so a half written chunk is never read
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+        with self.lock:
+            self.entries[h] = len(data)
+            self.total += len(data)
+            self.evict()
+
+    def discard(self, h: str):
+        with self.lock:
+            size = self.entries.pop(h, None)
+            if size is not None:
+                self.total -= size
+
+    # drop least recently used chunks untill under the size limit (lock must be held)
+    def evict(self):
+
+        for h in list(self.entries):
+
+            if self.total <= self.max_bytes:
+                break
+
+            if self.pins.get(h):
+                continue
+
+            self.total -= self.entries.pop(h)
+            try:
+                os.remove(self.path_for(h))
+            except OSError:
+                pass
+
+    # keep chunks around while a transfer that relies on them is in progress
+    def pin(self, hashes):
+        with self.lock:
+            for h in hashes:
+                self.pins[h] = self.pins.get(h, 0) + 1
+
+    def unpin(self, hashes):
+        with self.lock:
+            for h in hashes:
+                count = self.pins.get(h, 0) - 1
+                if count > 0:
+                    self.pins[h] = count
+                else:
+                    self.pins.pop(h, None)
+            self.evict()    # anything held over the limit can go now
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+# one store per process, the client and server pages share the same folder
+def shared() -> ChunkStore:
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = ChunkStore()
+        return _shared
@@ -2,12 +2,23 @@ import socket
 import numpy as np
 import cv2
 import struct
-import csv
 import threading
 import json
 import os
+import time
+import errno
+import selectors
+import logging
 import encrypt
-
+import transfer
+import recorder
+import registry
+import clipsync
+import metrics
+import framecodec
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pynput.mouse import Listener as MouseListener, Button
 from pynput.keyboard import Listener as KeyboardListener, Key
 from PySide6 import QtCore, QtWidgets, QtGui
@@ -15,22 +26,414 @@ from PySide6 import QtCore, QtWidgets, QtGui
 
 video_port = 5000
 control_port = 5001
+thumb_port = 5002
+
+log = logging.getLogger("remotepc.client")
+
+# performance counters, see metrics.py
+frames_received = metrics.counter("frames_received", "video frames recieved")
+frames_dropped = metrics.counter("frames_dropped", "video frames skipped by the decode pool")
+decode_time = metrics.histogram("decode_seconds", "video frame decode time")
+input_batches = metrics.counter("input_batches", "input batches sent to the server")
+
+# input is sent in batches this often, fast enough to feel immediate
+INPUT_TICK = 0.008
+
+# connection racing between a host's addresses
+CONNECT_STAGGER = 0.25      # seconds before the next address is tried alongside the first
+CONNECT_TIMEOUT = 10.0
+
+# address that connected last time per host name, tried first on the next connect
+_routes = {}
+_routes_lock = threading.Lock()
+
+# dashboard connections
+THUMB_CONNECT_TIMEOUT = 5.0
+THUMB_STALE = 45.0          # no thumbnail (or keepalive) for this long means the link is dead
+THUMB_RETRY = (2.0, 30.0)   # reconnect backoff, first and max
+
+# threads decoding frames, leave a core for the network and ui
+DECODE_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+
+# frames the server may have in flight before it waits for the client
+FRAME_CREDITS = 3
+
+# while recording, ask for a full frame this often so the player can seek
+RECORD_KEYFRAME_INTERVAL = 10.0
+
+
+# frames are read on one thread and decoded on a pool, then delivered strictly in sequence (delta frames
+# build on each other). a keyframe redraws everything, so frames still queued in front of one are skipped,
+# and when decoding falls behind on_backlog can ask the server for one
+class FramePipeline:
+
+    def __init__(self, decode, deliver, workers: int = DECODE_WORKERS, on_drop=None, on_backlog=None):
+        self.decode = decode        # data -> result or None
+        self.deliver = deliver      # called with results in sequence order
+        self.on_drop = on_drop      # called for every frame that is skipped
+        self.on_backlog = on_backlog    # called for frames submitted while decoding is behind
+        self.closed = False
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="decode")
+        self.max_pending = workers * 2
+        self.lock = threading.Condition()
+        self.pending = deque()      # futures not finished yet, oldest first
+        self.next_seq = 0
+        self.shown = -1             # sequence number of the last delivered frame
+        self.skip_to = 0            # frames before this keyframe are never drawn
+        self.dropped = 0
+
+    # queue a frame for decoding, key: it can be drawn without the frames before it
+    def submit(self, data, key: bool = False):
+
+        behind = False
+        with self.lock:
+            while self.pending and self.pending[0].done():
+                self.pending.popleft()
+
+            seq = self.next_seq
+            self.next_seq += 1
+
+            if key and self.pending:
+                # skip ahead, whatever has not started decoding is redrawn by this frame anyway
+                self.skip_to = seq
+                for fut in self.pending:
+                    if fut.cancel():
+                        self.drop()
+                self.pending = deque(fut for fut in self.pending if not fut.cancelled())
+                self.lock.notify_all()
+            elif len(self.pending) >= self.max_pending:
+                behind = True
+
+            self.pending.append(self.pool.submit(self.run, seq, data))
+
+        if behind and self.on_backlog:
+            self.on_backlog()
+
+    def run(self, seq: int, data):
+
+        with self.lock:
+            stale = seq < self.skip_to
+        result = None if stale else self.decode(data)
+
+        with self.lock:
+            # decoding runs in parallel, drawing waits for the frame before this one (a keyframe waits for nothing)
+            while not self.closed and seq > self.skip_to and self.shown != seq - 1:
+                self.lock.wait()
+            if self.closed:
+                return
+
+            if seq < self.skip_to:
+                self.drop()     # a newer keyframe replaces this one
+                return
+
+            self.shown = seq
+            if result is None:
+                self.drop()
+            else:
+                self.deliver(result)
+            self.lock.notify_all()
+
+    def drop(self):
+        self.dropped += 1
+        frames_dropped.inc()
+        if self.on_drop:
+            self.on_drop()
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.lock.notify_all()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+
+# holds only the newest frame for the ui, an unpainted frame is replaced by the next one
+class FrameMailbox(QtCore.QObject):
+    ready = QtCore.Signal()     # box went from empty to full, at most one is queued at a time
+
+    def __init__(self, on_done=None, parent=None):
+        super().__init__(parent)
+        self.lock = threading.Lock()
+        self.frame = None
+        self.dropped = 0    # frames replaced before they were painted
+        self.on_done = on_done  # called for every frame that leaves the box, painted or replaced
+
+    # called from the decode threads, pixels is the array the image points into
+    def post(self, img: QtGui.QImage, pixels=None):
+        with self.lock:
+            was_empty = self.frame is None
+            if not was_empty:
+                self.dropped += 1
+            self.frame = (img, pixels)
+
+        if was_empty:
+            self.ready.emit()
+        elif self.on_done:
+            self.on_done()
+
+    # called from the ui when painting, returns (image, pixels) or None
+    def take(self):
+        with self.lock:
+            frame, self.frame = self.frame, None
+
+        if frame is not None and self.on_done:
+            self.on_done()
+        return frame
+
+
+# outbound input, the ui thread only appends and a sender thread ships one sealed batch per tick
+# frame credits go out the same way, paintEvent must never wait on the control socket
+class InputBatcher:
+
+    def __init__(self, send, convert_move):
+        self.send = send                    # called with the batch message
+        self.convert_move = convert_move    # (x, y) in screen pixels -> frame position or None
+        self.cond = threading.Condition()
+        self.events = []        # ('move', (x, y)) or (type, value), oldest first
+        self.credits = 0        # frames finished since the last credit message
+        self.running = False
+        self.thread = None
+        self.sent = 0           # batches
+        self.merged = 0         # pointer moves dropped because a newer one replaced them
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+
+    # called from the ui thread, a move right after a move replaces it
+    def put(self, kind: str, value):
+        with self.cond:
+            if kind == "move" and self.events and self.events[-1][0] == "move":
+                self.events[-1] = (kind, value)
+                self.merged += 1
+                return
+            self.events.append((kind, value))
+            self.cond.notify()
+
+    # called from the ui and decode threads for every frame painted or skipped
+    def credit(self):
+        with self.cond:
+            self.credits += 1
+            self.cond.notify()
+
+    def run(self):
+
+        last = 0.0
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.events or self.credits or not self.running)
+                if not self.running:
+                    return
+
+            # let the rest of this tick's input pile up behind the first event
+            delay = last + INPUT_TICK - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+            with self.cond:
+                events, self.events = self.events, []
+                credits, self.credits = self.credits, 0
+
+            if credits:
+                self.send({"type": "credit", "n": credits})
+
+            batch = []
+            for kind, value in events:
+                if kind == "move":
+                    pos = self.convert_move(*value)
+                    if pos is None:
+                        continue
+                    batch.append({"type": "mouse_move", "value": pos})
+                else:
+                    batch.append({"type": kind, "value": value})
+
+            if batch:
+                self.send({"type": "input_batch", "events": batch})
+                self.sent += 1
+                input_batches.inc()
+            last = time.monotonic()
+
+
+# one dashboard link, parses [len][channel][blob] frames out of a nonblocking socket
+class ThumbLink:
+
+    def __init__(self, name: str, ip: str):
+        self.name = name
+        self.ip = ip
+        self.sock = None
+        self.buf = bytearray()
+        self.state = "idle"     # idle, connecting, open
+        self.deadline = 0.0     # connect timeout or staleness limit
+        self.retry_at = 0.0
+        self.backoff = THUMB_RETRY[0]
+
+
+# thumbnails from many servers, every socket is serviced by a single selector thread
+class ThumbnailMux(QtCore.QObject):
+    thumbReady = QtCore.Signal(str, bytes)  # host name, jpeg
+    linkState = QtCore.Signal(str, str)     # host name, status text
+
+    def __init__(self, hosts: dict, port: int = thumb_port, parent=None):
+        super().__init__(parent)
+        self.PSK = encrypt.load_key()
+        self.port = port
+        self.links = [ThumbLink(name, ip) for name, ip in hosts.items()]
+        self.sel = selectors.DefaultSelector()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=2)
+            self.thread = None
+
+    def run(self):
+
+        try:
+            while self.running:
+                now = time.monotonic()
+
+                for link in self.links:
+                    if link.state == "idle" and now >= link.retry_at:
+                        self.connect(link)
+                    elif link.state != "idle" and now >= link.deadline:
+                        self.fail(link, "timed out" if link.state == "connecting" else "no updates")
+
+                if not self.sel.get_map():
+                    time.sleep(0.25)
+                    continue
+
+                for key, _ in self.sel.select(timeout=0.25):
+                    link = key.data
+                    if link.state == "connecting":
+                        self.connected(link)
+                    else:
+                        self.read(link)
+        finally:
+            for link in self.links:
+                self.close(link)
+            self.sel.close()
+
+    def connect(self, link: ThumbLink):
+
+        link.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        link.sock.setblocking(False)
+        err = link.sock.connect_ex((link.ip, self.port))
+
+        # 10035 is WSAEWOULDBLOCK, windows reports an in progress connect with it
+        if err not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK, 10035):
+            self.fail(link, os.strerror(err))
+            return
+
+        link.state = "connecting"
+        link.deadline = time.monotonic() + THUMB_CONNECT_TIMEOUT
+        self.sel.register(link.sock, selectors.EVENT_WRITE, link)
+        self.linkState.emit(link.name, "Connecting ...")
+
+    def connected(self, link: ThumbLink):
+
+        err = link.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if err:
+            self.fail(link, os.strerror(err))
+            return
+
+        link.state = "open"
+        link.buf.clear()
+        link.backoff = THUMB_RETRY[0]
+        link.deadline = time.monotonic() + THUMB_STALE
+        self.sel.modify(link.sock, selectors.EVENT_READ, link)
+        self.linkState.emit(link.name, "Online")
+
+    def read(self, link: ThumbLink):
+
+        try:
+            data = link.sock.recv(65536)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self.fail(link, str(e))
+            return
+
+        if not data:
+            self.fail(link, "closed")
+            return
+
+        link.buf += data
+
+        # pull out every complete frame, a thumbnail is usually one or two reads
+        while len(link.buf) >= 5:
+            n, chan = struct.unpack_from("!IB", link.buf)
+            if len(link.buf) < 5 + n:
+                break
+            blob = bytes(link.buf[5:5 + n])
+            del link.buf[:5 + n]
+
+            try:
+                aad, jpeg = encrypt.open_frame(self.PSK, chan, blob)
+            except Exception:
+                self.fail(link, "bad key")
+                return
+
+            if aad == b"thumb":
+                link.deadline = time.monotonic() + THUMB_STALE
+                self.thumbReady.emit(link.name, jpeg)
+
+    def fail(self, link: ThumbLink, why: str):
+        self.close(link)
+        link.retry_at = time.monotonic() + link.backoff
+        link.backoff = min(link.backoff * 2, THUMB_RETRY[1])
+        self.linkState.emit(link.name, f"Offline ({why})")
+
+    def close(self, link: ThumbLink):
+        if link.sock is not None:
+            try:
+                self.sel.unregister(link.sock)
+            except (KeyError, ValueError):
+                pass
+            link.sock.close()
+            link.sock = None
+        link.state = "idle"
 
 
 class ClientWorker(QtCore.QObject):
-    frameReady = QtCore.Signal(QtGui.QImage)    # send decoded image 
     statusText = QtCore.Signal(str)     # send text to display in videobox
     closed = QtCore.Signal()    # send closed message 
+    browseResult = QtCore.Signal(dict)  # remote directory page
+    searchResult = QtCore.Signal(dict)  # remote file name matches
+    fileError = QtCore.Signal(str)      # server could not send a requested file
+    streamSettings = QtCore.Signal(dict)    # effective fps / scale / quality / codec confirmed by the server
 
-    def __init__(self, host: str, video_port: int = 5000, control_port: int = 5001, parent=None):
+    def __init__(self, host, video_port: int = 5000, control_port: int = 5001, name: str | None = None, parent=None):
         super().__init__(parent)
-        self.host = host    # ip converted in UI
+        self.addrs = [host] if isinstance(host, str) else list(host)    # candidate ips, converted in UI
+        self.host = self.addrs[0]   # address in use once connected
+        self.name = name            # device name, for the route cache
         self.video_port = video_port
         self.control_port = control_port
         self.client_running = False
         self.PSK = encrypt.load_key()
         self.control_socket = None
         self.video_socket = None
+        self.transfers = None
+        self.clipboard = None
+        self.pipeline = None
+        self.recorder = None    # session recording, None when not recording
+        self.decoder = framecodec.FrameDecoder()    # the retained canvas op frames are drawn on
+        self.keyframe_asked = 0.0   # monotonic time of the last keyframe request
+        self.input = InputBatcher(self.send_command, self.frame_position)
+        self.mailbox = FrameMailbox(on_done=self.return_credit)   # newest frame for the video widget
         self.pressed_keys = set()   # stores keystrokes to send
         self.window_dims = {'x': 0, 'y': 0, 'w': 1, 'h': 1}         # initalize for mouse window acounting
         self.frame_dims  = {'w': 1, 'h': 1}
@@ -42,44 +445,66 @@ class ClientWorker(QtCore.QObject):
         self.client_running = True
 
         try:
-            # control connect
-            self.statusText.emit(f"Connecting to {self.host}:{self.control_port} ...")
-            self.control_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.control_socket.connect((self.host, self.control_port))
+            # control races every address, video then connects to the one that won so both reach the same machine
+            self.statusText.emit(f"Connecting to {', '.join(self.addrs)} ...")
+            self.control_socket, self.host = race_connect(self.addrs, self.control_port)
+            self.video_socket, _ = race_connect([self.host], self.video_port)
 
-            # video connect 
-            self.statusText.emit(f"Connecting to {self.host}:{self.video_port} ...")
-            self.video_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.video_socket.connect((self.host, self.video_port))
+            remember_route(self.name, self.host)
+            self.statusText.emit(f"Connected to {self.host}.")
 
-            self.statusText.emit("Connected.")
+            self.transfers = transfer.Transfers(self.control_socket, self.PSK, "downloads")
+            self.clipboard = clipsync.ClipboardSync(self.control_socket, self.PSK)
 
             # control thread recieves data from the server 
             control_thread = threading.Thread(target=self.control_loop, daemon=True)
             control_thread.start()
 
+            # decode on a thread pool while this thread keeps reading the socket, drawn in order onto the canvas
+            self.pipeline = FramePipeline(self.decode_frame, self.show_frame, on_drop=self.return_credit,
+                                          on_backlog=self.request_keyframe)
+            pipeline = self.pipeline
+            metrics.gauge("decode_queue", "frames waiting for or in decode", fn=lambda: len(pipeline.pending))
+
+            # server only sends while it holds credits, one comes back per painted or skipped frame
+            self.send_command({"type": "flow_control", "credits": FRAME_CREDITS})
+
+            # tiles seen before are kept on both ends and only referenced when they come back
+            self.send_command({"type": "tile_cache", "tiles": framecodec.CACHE_TILES})
+
+            # mouse and keyboard go out in batches from their own thread
+            self.input.start()
+
+            # ask what the server is streaming with (an empty change just reports)
+            self.set_stream()
+
             # main receive loop
             while self.client_running:
                 jpeg = encrypt.recv_open(self.video_socket, self.PSK, aad=b"video")
                 if jpeg is None:
                     self.statusText.emit("Disconnected from server.")   # notify user of disconnect
                     break
-                arr = np.frombuffer(jpeg, dtype=np.uint8)
-                frame_bgr = cv2.imdecode(arr, cv2.IMREAD_COLOR)
-                if frame_bgr is None:
-                    continue
 
-                # get window dimensions for mouse calculations
-                h, w = frame_bgr.shape[:2]
-                with self.state_lock:
-                    self.frame_dims['w'], self.frame_dims['h'] = w, h   # update frame values
+                frames_received.inc()
+
+                # recording stores the frame exactly as recieved
+                rec = self.recorder
+                if rec:
+                    rec.add(jpeg)
+                    if time.monotonic() - self.keyframe_asked > RECORD_KEYFRAME_INTERVAL:
+                        self.request_keyframe()
 
-                img = frame_to_qimage(frame_bgr)    # convert to image type pyqt can use
-                self.frameReady.emit(img)
+                self.pipeline.submit(jpeg, key=framecodec.is_keyframe(jpeg))
 
         except Exception as e:
             self.statusText.emit(f"Client error: {e}")
         finally:
+            self.input.stop()
+            if self.clipboard:
+                self.clipboard.close()
+            self.stop_recording()
+            if self.pipeline:
+                self.pipeline.close()
             try:
                 if self.video_socket:
                     self.video_socket.close()
@@ -92,6 +517,84 @@ class ClientWorker(QtCore.QObject):
                 pass
             self.closed.emit()
 
+    # runs on a decode thread, tile images are decoded here and drawn in show_frame
+    def decode_frame(self, data):
+        with decode_time.time():
+            return self.decoder.parse(data) if framecodec.is_op_frame(data) else None
+
+    # called in frame order with the newest decoded frame
+    def show_frame(self, parsed):
+
+        result = self.draw_ops(parsed)
+        if result is None:
+            self.return_credit()    # nothing new to paint
+            return
+
+        (w, h), frame_bgr, img = result
+
+        # get window dimensions for mouse calculations
+        with self.state_lock:
+            self.frame_dims['w'], self.frame_dims['h'] = w, h   # update frame values
+
+        self.mailbox.post(img, frame_bgr)   # image points into frame_bgr, keep it alive with it
+
+    # apply an op frame to the canvas, returns a frame to show or None
+    def draw_ops(self, parsed):
+
+        if parsed is None:
+            self.decoder.canvas = None      # a broken frame leaves the canvas wrong
+            self.request_keyframe()
+            return None
+
+        flags, w, h, ops = parsed
+        if not ops and self.decoder.canvas is not None:
+            return None     # screen did not change
+
+        canvas = self.decoder.apply(parsed)
+        if canvas is None:
+            self.request_keyframe()     # joined part way, deltas are useless untill a keyframe
+            return None
+
+        # the canvas keeps changing while the ui paints, so the ui gets its own copy of it,
+        # made smaller in the same pass when the window is much smaller than the frame
+        with self.state_lock:
+            ww, wh = self.window_dims['w'], self.window_dims['h']
+        factor = reduce_factor(w, h, ww, wh)
+        if factor == 1:
+            frame_bgr = canvas.copy()
+        else:
+            frame_bgr = cv2.resize(canvas, (w // factor, h // factor), interpolation=cv2.INTER_AREA)
+        return (w, h), frame_bgr, frame_to_qimage(frame_bgr)
+
+    # ask the server to redraw the whole screen, at most once a second
+    def request_keyframe(self):
+        now = time.monotonic()
+        if now - self.keyframe_asked < 1.0:
+            return
+        self.keyframe_asked = now
+        self.send_command({"type": "keyframe"})
+
+    # append every recieved frame to a recording file
+    def start_recording(self, path: str):
+        self.stop_recording()
+        self.recorder = recorder.Recorder(path)
+        self.keyframe_asked = 0.0
+        self.request_keyframe()     # the recording has to start from a full frame
+
+    def stop_recording(self):
+        rec, self.recorder = self.recorder, None
+        if rec:
+            rec.close()
+            log.info(f"Saved recording to {rec.path} ({rec.count} frames)")
+
+    # let the server send one more frame, sent from the input thread
+    def return_credit(self):
+        self.input.credit()
+
+    # frames skipped by the decode pool and the mailbox
+    def dropped_frames(self) -> int:
+        return self.mailbox.dropped + (self.pipeline.dropped if self.pipeline else 0)
+
     # close connection
     @QtCore.Slot()
     def stop(self):
@@ -123,8 +626,8 @@ class ClientWorker(QtCore.QObject):
             self.window_dims.update({'x': x, 'y': y, 'w': w, 'h': h})   # update window values
 
 
-    def mouse_move(self, x, y):
-        # calculate for mouse in window
+    # screen position -> frame position, None when outside the video (runs on the input thread)
+    def frame_position(self, x, y):
         with self.state_lock:
             wx, wy, ww, wh = (self.window_dims['x'], self.window_dims['y'], self.window_dims['w'], self.window_dims['h'])
             fw, fh = self.frame_dims['w'], self.frame_dims['h']
@@ -136,151 +639,244 @@ class ClientWorker(QtCore.QObject):
             # scale to frame resolution
             adjusted_x = frame_x * (fw / float(ww))
             adjusted_y = frame_y * (fh / float(wh))
+            return (int(adjusted_x), int(adjusted_y))
+        return None
 
-            self.send_command({'type': 'mouse_move', 'value': (int(adjusted_x), int(adjusted_y))})
+    # input methods are called on the ui thread and only queue the event
+    def mouse_move(self, x, y):
+        self.input.put("move", (x, y))
 
     def mouse_click(self, which: str):
-        self.send_command({'type': 'mouse_down', 'value': which})
+        self.input.put("mouse_down", which)
 
     def mouse_release(self, which: str):
-        self.send_command({'type': 'mouse_up', 'value': which})
+        self.input.put("mouse_up", which)
 
     def key_press(self, name: str):
         if name not in self.pressed_keys:    # only send once per press
             self.pressed_keys.add(name)
-            self.send_command({'type': 'key_down', 'value': name})
+            self.input.put("key_down", name)
 
     def key_release(self, name: str):
         if name in self.pressed_keys:   # only delete once per release
             self.pressed_keys.discard(name)
-        self.send_command({'type': 'key_up', 'value': name})
+        self.input.put("key_up", name)
 
 
     # send files along the control socket
     def send_file_to_server(self, path: str):
 
         # make sure this is the correct socket
-        if not self.control_socket:
+        if not self.control_socket or not self.transfers:
             return
 
+        # hashing and sending runs in the background so the ui does not freeze
+        self.transfers.offer_file(path)
+
+    # change fps, scale, quality and / or codec mid session, the server replies with what it applied
+    def set_stream(self, **changes):
+        self.send_command({"type": "stream_settings", **changes})
+
+    # ask the server for a file
+    def request_file(self, path: str):
+        self.send_command({"type": "request_file", "path": path})
+
+    # ask the server for a page of a directory ("" lists drives / root)
+    def browse(self, path: str, offset: int = 0):
+        self.send_command({"type": "browse", "path": path, "offset": offset})
+
+    # find server files whose name starts with prefix
+    def search_files(self, root: str, prefix: str):
+        self.send_command({"type": "search", "root": root, "prefix": prefix})
+
+    
+    def control_loop(self):
         try:
-            # get file info
-            size = os.path.getsize(path)
-            name = os.path.basename(path)
+            while self.client_running:
 
-            # send file info 
-            encrypt.send_json(self.control_socket, self.PSK, {
-                "type": "file_start",
-                "name": name,
-                "size": size,
-            })
+                aad, data = encrypt.recv_any(self.control_socket, self.PSK)
+                if aad is None:
+                    break
 
-            # send file in chunks
-            with open(path, "rb") as f:
+                # file data for the download in progress
+                if aad in transfer.FILE_CHANNELS:
+                    self.transfers.feed(aad, data)
+                    continue
 
-                while True:
+                # part of a large clipboard
+                if aad == b"clip":
+                    self.clipboard.feed(data)
+                    continue
 
-                    chunk = f.read(64 * 1024)
+                cmd = json.loads(data.decode("utf-8"))
 
-                    # close transmission once finished
-                    if not chunk:
-                        break
+                # file offers, chunks and completion
+                if self.transfers.handle(cmd):
+                    continue
 
-                    encrypt.send_sealed(self.control_socket, self.PSK, chunk, aad=b"file")
+                t = cmd.get("type")
 
-            # indicate that the file has completed transmission
-            encrypt.send_json(self.control_socket, self.PSK, {
-                "type": "file_end",
-                "name": name,
-            })
+                # remote file browser replies
+                if t == "browse_result":
+                    self.browseResult.emit(cmd)
+                elif t == "search_result":
+                    self.searchResult.emit(cmd)
+                elif t == "file_error":
+                    self.fileError.emit(f"{cmd.get('path')}: {cmd.get('error')}")
+                elif t == "clipboard":
+                    self.clipboard.handle(cmd)
+                elif t == "stream_settings":
+                    cmd.pop("type")
+                    self.streamSettings.emit(cmd)
 
-        # 'handel' file send has broken
-        except Exception as err:
-            print(f"Error sending file: {err}")
+        except Exception as e:
+            log.warning(f"Control loop error: {e}")
+        finally:
+            self.transfers.close()
 
 
-    def recv_file_from_server(self, header: dict):
 
-        # get file info
-        filename = header.get("name", "downloaded.bin")
-        size = int(header.get("size", 0))
+# wrap an opencv frame as a qt image, qt reads bgr directly so there is no colour conversion copy
+# the image does not own the pixels, frame_bgr must outlive it
+def frame_to_qimage(frame_bgr: np.ndarray) -> QtGui.QImage:
+    h, w, ch = frame_bgr.shape
+    return QtGui.QImage(frame_bgr.data, w, h, frame_bgr.strides[0], QtGui.QImage.Format_BGR888)
 
-        # save location
-        os.makedirs("downloads", exist_ok=True)
-        path = os.path.join("downloads", filename)
 
-        remaining = size
+# largest of 1/2, 1/4 and 1/8 size that still fills the window, 1 when the frame is needed at full size
+def reduce_factor(frame_w: int, frame_h: int, window_w: int, window_h: int) -> int:
 
-        with open(path, "wb") as f:
+    if window_w <= 1 or window_h <= 1:  # window size not known yet
+        return 1
 
-            while remaining > 0 and self.client_running:
+    for factor in (8, 4, 2):
+        if frame_w // factor >= window_w and frame_h // factor >= window_h:
+            return factor
 
-                chunk = encrypt.recv_open(self.control_socket, self.PSK, aad=b"file")
+    return 1
 
-                # this should only be hit if the program closes prematurly
-                if chunk is None:
-                    print("Connection closed while receiving file.")
-                    break
 
-                f.write(chunk)
-                remaining -= len(chunk)
+# get device ip from the host registry
+def getip(name, use_public: bool | None = None):
 
-        print(f"Saved file to {path}")
+    host = registry.shared().get(name)
+    if host is None:
+        return None     # ip not found
 
-    
-    def control_loop(self):
-        try:
-            while self.client_running:
+    private_ip, public_ip = host["privateip"], host["publicip"]
 
-                cmd = encrypt.recv_json(self.control_socket, self.PSK)
-                if cmd is None:
-                    break
+    '''
+    return the desired ip if avalible else return whats avalible 
+    prioritize private if user does not select
+    '''
+    if use_public is True:
+        return public_ip or private_ip
+    else:
+        return private_ip or public_ip
 
-                t = cmd.get("type")
 
-                # prepare to recieve file
-                if t == "file_start":
-                    self.recv_file_from_server(cmd)
+# all known addresses for a host, best guess first
+#   an explicit choice puts that type first, auto starts with whatever worked last time
+def host_addresses(name, use_public: bool | None = None) -> list:
 
-                # acknowledge file completion
-                elif t == "file_end":
-                    name = cmd.get("name")
-                    print(f"Download complete: {name}")
+    host = registry.shared().get(name)
+    if host is None:
+        return []
 
-        except Exception as e:
-            print(f"Control loop error: {e}")
+    private_ip, public_ip = host["privateip"], host["publicip"]
+    addrs = [public_ip, private_ip] if use_public is True else [private_ip, public_ip]
 
+    if use_public is None:
+        with _routes_lock:
+            cached = _routes.get(name)
+        if cached in addrs:
+            addrs.insert(0, cached)
 
+    return list(dict.fromkeys(a for a in addrs if a))   # drop blanks and repeats
 
-# convert opencv frame to qt image 
-def frame_to_qimage(frame_bgr: np.ndarray) -> QtGui.QImage:
-    rgb = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
-    h, w, ch = rgb.shape
-    return QtGui.QImage(rgb.data, w, h, ch * w, QtGui.QImage.Format_RGB888)
 
+def remember_route(name, ip: str):
+    if name:
+        with _routes_lock:
+            _routes[name] = ip
 
-# get device ip from csv
-def getip(name, use_public: bool | None = None):
 
-    with open("hosts.csv", newline="") as csvfile:
-        for row in csv.DictReader(csvfile):
+# connect to the first address that answers, returns (socket, ip)
+#   attempts start CONNECT_STAGGER apart (sooner if every attempt so far failed) and overlap,
+#   so a dead address costs a quarter second instead of a full tcp timeout
+def race_connect(addrs: list, port: int, stagger: float = CONNECT_STAGGER, timeout: float = CONNECT_TIMEOUT):
+
+    sel = selectors.DefaultSelector()
+    pending = {}    # socket -> ip
+    errors = []
+    winner = None
+    start = time.monotonic()
+    next_start = start
+    i = 0
 
-            csv_name = row.get("hostname", "").strip()
-            if csv_name != name:    # loop untill correct index
-                continue
+    try:
+        while winner is None:
+            now = time.monotonic()
 
-            private_ip = (row.get("privateip") or "").strip() or None
-            public_ip  = (row.get("publicip") or "").strip() or None
+            if i < len(addrs) and (now >= next_start or not pending):
+                ip = addrs[i]
+                i += 1
+                next_start = now + stagger
 
-            '''
-            return the desired ip if avalible else return whats avalible 
-            prioritize private if user does not select
-            '''
-            if use_public is True:
-                return public_ip or private_ip
-            elif use_public is False:
-                return private_ip or public_ip
-            else:   
-                return private_ip or public_ip
+                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                sock.setblocking(False)
+                err = sock.connect_ex((ip, port))
+
+                if err == 0:
+                    winner = (sock, ip)
+                    break
+                # 10035 is WSAEWOULDBLOCK, windows reports an in progress connect with it
+                if err not in (errno.EINPROGRESS, errno.EWOULDBLOCK, 10035):
+                    errors.append(f"{ip}: {os.strerror(err)}")
+                    sock.close()
+                    continue
 
-    return None     # ip not found
\ No newline at end of file
+                pending[sock] = ip
+                sel.register(sock, selectors.EVENT_WRITE)
+
+            if not pending:
+                raise ConnectionError(f"Could not connect on port {port} ({'; '.join(errors) or 'no address'})")
+
+            remaining = start + timeout - now
+            if remaining <= 0:
+                raise TimeoutError(f"Timed out connecting on port {port}")
+
+            wait = min(remaining, next_start - now) if i < len(addrs) else remaining
+            for key, _ in sel.select(timeout=max(wait, 0)):
+                sock = key.fileobj
+                err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                sel.unregister(sock)
+                ip = pending.pop(sock)
+
+                if err:
+                    errors.append(f"{ip}: {os.strerror(err)}")
+                    sock.close()
+                elif winner is None:
+                    winner = (sock, ip)
+                else:
+                    sock.close()
+    finally:
+        # cancel the attempts that lost
+        for sock in pending:
+            sock.close()
+        sel.close()
+
+    winner[0].setblocking(True)
+    return winner
+
+
+# every known device as {name: ip}, same ip choice as getip
+def known_hosts(use_public: bool | None = None) -> dict:
+
+    hosts = {}
+    for host in registry.shared().all():
+        ip = getip(host["name"], use_public=use_public)
+        if ip:
+            hosts[host["name"]] = ip
+
+    return hosts
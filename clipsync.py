@@ -0,0 +1,194 @@
+import zlib
+import base64
+import struct
+import hashlib
+import logging
+import threading
+import encrypt
+
+log = logging.getLogger("remotepc.clipboard")
+
+# clipboard sharing over the control socket
+#
+# small payloads go inline in one control message:
+#   {"type": "clipboard", "hash", "kind": "text"|"image", "codec": "zlib"|"raw", "size", "data": base64}
+# larger ones announce themselves the same way without "data" and then follow as chunks on the "clip" channel,
+# which the shaper treats as bulk traffic so input is never stuck behind an image:
+#   [hash 16][index u32][count u32] + bytes
+#
+# text is zlib compressed, images are png (already compressed)
+
+INLINE_BYTES = 16 * 1024
+CHUNK_BYTES = 48 * 1024
+MAX_BYTES = 32 * 1024 * 1024    # bigger clipboards are not shared
+CHUNK_STRUCT = struct.Struct("!16sII")
+
+
+def clip_hash(kind: str, data: bytes) -> str:
+    return hashlib.blake2b(kind.encode() + b"\0" + data, digest_size=16).hexdigest()
+
+
+# the local clipboard, set by whichever ui owns it (no backend = headless, sharing is off)
+_lock = threading.Lock()
+_backend = None         # called with (kind, data) to replace the local clipboard
+_sessions = set()
+_last_hash = None       # what the local clipboard holds, so echoes of applied content are ignored
+
+
+def set_backend(apply):
+    global _backend
+    with _lock:
+        _backend = apply
+
+
+# called by the backend whenever the local clipboard changes
+def local_changed(kind: str, data: bytes):
+
+    global _last_hash
+    h = clip_hash(kind, data)
+
+    with _lock:
+        if h == _last_hash:
+            return      # unchanged, or the change we just applied ourselves
+        _last_hash = h
+        sessions = list(_sessions)
+
+    for session in sessions:
+        session.offer(kind, data, h)
+
+
+def apply_remote(kind: str, data: bytes, h: str):
+
+    global _last_hash
+    with _lock:
+        backend = _backend
+        _last_hash = h
+
+    if backend is None:
+        log.info("Clipboard recieved but there is no local clipboard to put it in")
+        return
+    backend(kind, data)
+
+
+# clipboard sync with the peer on one control socket
+class ClipboardSync:
+
+    def __init__(self, sock, key: bytes):
+        self.sock = sock
+        self.key = key
+        self.lock = threading.Lock()
+        self.sent = None        # hash last sent, never sent twice in a row
+        self.sending = None     # hash of the chunked send in progress, a newer copy cancels it
+        self.incoming = None    # {"hash", "kind", "codec", "size", "parts": list}
+
+        with _lock:
+            _sessions.add(self)
+
+    def close(self):
+        with _lock:
+            _sessions.discard(self)
+        with self.lock:
+            self.sending = None
+            self.incoming = None
+
+    # new local clipboard content for the peer
+    def offer(self, kind: str, data: bytes, h: str):
+
+        with self.lock:
+            if h == self.sent:
+                return
+            self.sent = h
+
+        codec = "raw"
+        if kind == "text":
+            data, codec = zlib.compress(data, 6), "zlib"
+
+        if len(data) > MAX_BYTES:
+            log.info(f"Clipboard not shared, {len(data)} bytes is over the limit")
+            return
+
+        head = {"type": "clipboard", "hash": h, "kind": kind, "codec": codec, "size": len(data)}
+
+        try:
+            if len(data) <= INLINE_BYTES:
+                encrypt.send_json(self.sock, self.key, {**head, "data": base64.b64encode(data).decode("ascii")})
+                return
+
+            head["chunks"] = (len(data) + CHUNK_BYTES - 1) // CHUNK_BYTES
+            encrypt.send_json(self.sock, self.key, head)
+        except OSError:
+            return
+
+        with self.lock:
+            self.sending = h
+        threading.Thread(target=self.send_chunks, args=(h, data, head["chunks"]), daemon=True).start()
+
+    # large payloads trickle out as bulk traffic
+    def send_chunks(self, h: str, data: bytes, count: int):
+
+        raw_hash = bytes.fromhex(h)
+        for i in range(count):
+            with self.lock:
+                if self.sending != h:
+                    return  # clipboard changed again, the peer will get the newer one
+            part = data[i * CHUNK_BYTES:(i + 1) * CHUNK_BYTES]
+            try:
+                encrypt.send_sealed(self.sock, self.key, CHUNK_STRUCT.pack(raw_hash, i, count) + part, aad=b"clip")
+            except OSError:
+                return
+
+        with self.lock:
+            if self.sending == h:
+                self.sending = None
+
+    # a "clipboard" control message
+    def handle(self, cmd: dict):
+
+        h = cmd.get("hash")
+        kind = cmd.get("kind")
+        if not h or kind not in ("text", "image"):
+            return
+
+        # the peer will not send this back to us, and we should not send it back to the peer
+        with self.lock:
+            self.sent = h
+
+        if "data" in cmd:
+            self.finish(h, kind, cmd.get("codec"), base64.b64decode(cmd["data"]))
+            return
+
+        with self.lock:
+            self.incoming = {"hash": h, "kind": kind, "codec": cmd.get("codec"),
+                             "size": int(cmd.get("size", 0)), "parts": [None] * int(cmd.get("chunks", 0))}
+
+    # a chunk from the "clip" channel
+    def feed(self, payload):
+
+        raw_hash, index, count = CHUNK_STRUCT.unpack_from(payload)
+        h = raw_hash.hex()
+
+        with self.lock:
+            inc = self.incoming
+            if inc is None or inc["hash"] != h or count != len(inc["parts"]) or index >= count:
+                return  # left over from a clipboard that was replaced
+            inc["parts"][index] = bytes(payload[CHUNK_STRUCT.size:])
+            if any(p is None for p in inc["parts"]):
+                return
+            self.incoming = None
+
+        self.finish(h, inc["kind"], inc["codec"], b"".join(inc["parts"]))
+
+    def finish(self, h: str, kind: str, codec: str, data: bytes):
+
+        try:
+            if codec == "zlib":
+                data = zlib.decompress(data)
+        except zlib.error:
+            log.warning("Clipboard payload could not be decompressed")
+            return
+
+        if clip_hash(kind, data) != h:
+            log.warning("Clipboard payload did not match its hash")
+            return
+
+        apply_remote(kind, data, h)
@@ -0,0 +1,168 @@
+import os
+import bisect
+import string
+import threading
+
+
+PAGE_SIZE = 200             # entries per browse reply
+MAX_INDEXED = 200_000       # names kept for prefix search
+WARM_DIRS = 2_000           # directories crawled in the background per root
+
+
+# cached listing of one directory
+class DirListing:
+
+    def __init__(self, mtime_ns: int, entries: list):
+        self.mtime_ns = mtime_ns    # directory mtime when scanned, changes on add/remove/rename
+        self.entries = entries      # [name, is_dir, size, mtime] sorted dirs first
+
+
+# server side cache of directory listings, refreshed only when a directory changes
+class DirIndex:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.dirs = {}          # path -> DirListing
+        self.names = []         # sorted (lower name, path, is_dir) for prefix search
+        self.warmed = set()     # roots already crawled
+
+    # listing for path, rescanned only if the directory mtime changed
+    def listing(self, path: str) -> DirListing:
+
+        st = os.stat(path)
+
+        with self.lock:
+            cached = self.dirs.get(path)
+            if cached and cached.mtime_ns == st.st_mtime_ns:
+                return cached
+
+        entries = []
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir()
+                    info = entry.stat()
+                except OSError:
+                    continue    # broken link or no permission
+                entries.append([entry.name, is_dir, 0 if is_dir else info.st_size, int(info.st_mtime)])
+
+        entries.sort(key=lambda e: (not e[1], e[0].lower()))
+        listing = DirListing(st.st_mtime_ns, entries)
+
+        with self.lock:
+            old = self.dirs.get(path)
+            self.dirs[path] = listing
+            self.reindex(path, old.entries if old else [], entries)
+
+        return listing
+
+    # swap a directory's names in the search index (lock must be held)
+    def reindex(self, path: str, old: list, new: list):
+
+        for name, is_dir, _, _ in old:
+            key = (name.lower(), os.path.join(path, name), is_dir)
+            i = bisect.bisect_left(self.names, key)
+            if i < len(self.names) and self.names[i] == key:
+                del self.names[i]
+
+        for name, is_dir, _, _ in new:
+            if len(self.names) >= MAX_INDEXED:
+                break
+            bisect.insort(self.names, (name.lower(), os.path.join(path, name), is_dir))
+
+    # one page of a directory, sizes and times of the page are re-checked
+    def page(self, path: str, offset: int = 0, limit: int = PAGE_SIZE) -> dict:
+
+        # no path lists drives on windows, root elsewhere
+        if not path:
+            return roots_page()
+
+        path = os.path.abspath(os.path.expanduser(path))
+        listing = self.listing(path)
+        rows = listing.entries[offset:offset + limit]
+
+        # files can change without touching the directory mtime
+        for row in rows:
+            try:
+                st = os.stat(os.path.join(path, row[0]))
+                if not row[1]:
+                    row[2] = st.st_size
+                row[3] = int(st.st_mtime)
+            except OSError:
+                pass
+
+        parent = os.path.dirname(path)
+
+        return {
+            "path": path,
+            "parent": parent if parent != path else "",
+            "offset": offset,
+            "total": len(listing.entries),
+            "entries": [{"name": n, "path": os.path.join(path, n), "dir": d, "size": s, "mtime": m}
+                        for n, d, s, m in rows],
+        }
+
+    # names starting with prefix (case insensitive), optionally under root
+    def search(self, prefix: str, root: str = "", limit: int = 100) -> list:
+
+        under = ""
+        if root:
+            root = os.path.abspath(root)
+            under = root if root.endswith(os.sep) else root + os.sep
+            self.warm(root)
+
+        prefix = prefix.lower()
+        results = []
+
+        with self.lock:
+            i = bisect.bisect_left(self.names, (prefix,))
+            while i < len(self.names) and len(results) < limit:
+                name, path, is_dir = self.names[i]
+                if not name.startswith(prefix):
+                    break
+                if path.startswith(under):
+                    results.append({"path": path, "dir": is_dir})
+                i += 1
+
+        return results
+
+    # index a tree in the background so search finds names that were never browsed
+    def warm(self, root: str):
+
+        with self.lock:
+            if root in self.warmed:
+                return
+            self.warmed.add(root)
+
+        threading.Thread(target=self.crawl, args=(root,), daemon=True).start()
+
+    def crawl(self, root: str):
+
+        queue = [root]
+        scanned = 0
+
+        while queue and scanned < WARM_DIRS:
+            path = queue.pop(0)
+            try:
+                listing = self.listing(path)
+            except OSError:
+                continue
+            scanned += 1
+            queue.extend(os.path.join(path, name) for name, is_dir, _, _ in listing.entries if is_dir)
+
+
+# top level entries when no path is given
+def roots_page() -> dict:
+
+    if os.name == "nt":
+        names = [f"{d}:\\" for d in string.ascii_uppercase if os.path.exists(f"{d}:\\")]
+    else:
+        names = ["/"]
+
+    return {
+        "path": "",
+        "parent": "",
+        "offset": 0,
+        "total": len(names),
+        "entries": [{"name": n, "path": n, "dir": True, "size": 0, "mtime": 0} for n in names],
+    }
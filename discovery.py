@@ -0,0 +1,127 @@
+import os
+import json
+import time
+import socket
+import logging
+import threading
+import encrypt
+import registry
+
+
+log = logging.getLogger("remotepc.discovery")
+
+DISCOVERY_PORT = 5003
+MAGIC = b"RPCDISC1"
+PROBE_INTERVAL = 30.0   # seconds between broadcasts from the client
+REPLY_WINDOW = 2.0      # how long a probe's replies are accepted
+
+# probe:  MAGIC + 16 byte nonce, broadcast in the clear
+# reply:  MAGIC + sealed json {nonce, machine, ports}, only devices sharing the PSK can answer or be read
+
+
+# server side, answers probes untill running() is false
+def serve(PSK, ports: dict, running):
+
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            sock.bind(("", DISCOVERY_PORT))
+        except OSError as e:
+            log.error(f"Discovery responder not started: {e}")
+            return
+        sock.settimeout(1.0)
+
+        machine = socket.gethostname()
+
+        while running():
+            try:
+                data, addr = sock.recvfrom(512)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+
+            if len(data) != len(MAGIC) + 16 or not data.startswith(MAGIC):
+                continue
+
+            reply = {"nonce": data[len(MAGIC):].hex(), "machine": machine, "ports": ports}
+            try:
+                sock.sendto(MAGIC + encrypt.seal(PSK, json.dumps(reply).encode(), aad=b"discover"), addr)
+            except OSError:
+                pass
+
+
+# client side, broadcasts probes and keeps the host registry up to date with the replies
+class Listener:
+
+    def __init__(self, hosts: registry.HostRegistry | None = None, on_found=None):
+        self.PSK = None     # read on the listener thread, see key()
+        self.hosts = hosts or registry.shared()
+        self.on_found = on_found    # called with (name, ip) for every reply
+        self.running = False
+        self.wake = threading.Event()
+
+    def start(self):
+        self.running = True
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def stop(self):
+        self.running = False
+        self.wake.set()
+
+    # probe now instead of waiting for the next interval
+    def probe_now(self):
+        self.wake.set()
+
+    def run(self):
+
+        while self.running:
+            try:
+                if self.key() is not None:
+                    self.probe()
+            except (OSError, ValueError) as e:
+                log.warning(f"Discovery probe failed: {e}")
+
+            self.wake.wait(PROBE_INTERVAL)
+            self.wake.clear()
+
+    # the shared key once there is one, never created here (a fresh random key could not read any reply)
+    def key(self):
+        if self.PSK is None and os.path.exists(encrypt.KEY_FILE):
+            self.PSK = encrypt.load_key()
+        return self.PSK
+
+    def probe(self):
+
+        nonce = os.urandom(16)
+
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+            sock.sendto(MAGIC + nonce, ("255.255.255.255", DISCOVERY_PORT))
+
+            deadline = time.monotonic() + REPLY_WINDOW
+            while self.running:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                sock.settimeout(remaining)
+
+                try:
+                    data, (ip, _) = sock.recvfrom(2048)
+                except socket.timeout:
+                    break
+
+                if not data.startswith(MAGIC):
+                    continue
+                try:
+                    reply = json.loads(encrypt.unseal(self.PSK, data[len(MAGIC):], aad=b"discover"))
+                except Exception:
+                    continue    # different key or garbage
+
+                # a reply to an older probe could be a replay
+                if reply.get("nonce") != nonce.hex() or not reply.get("machine"):
+                    continue
+
+                name = self.hosts.seen(reply["machine"], ip)
+                if self.on_found:
+                    self.on_found(name, ip)
@@ -1,9 +1,25 @@
-import os, json, struct
+import os, json, struct, threading, weakref
+import shaper
+import metrics
 from typing import Optional
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 
 KEY_FILE = "secret.key"     # raw 32 byte PSK
 
+# every message says which channel it belongs to so one socket can carry several
+# file chunks use one channel per codec so the codec is authenticated without a plaintext tag
+CHANNELS = {b"control": 1, b"file": 2, b"video": 3, b"file-zlib": 4, b"file-zstd": 5, b"thumb": 6,
+            b"clip": 7}
+CHANNEL_NAMES = {v: k for k, v in CHANNELS.items()}
+
+seal_time = metrics.histogram("seal_seconds", "time to encrypt one message")
+open_time = metrics.histogram("open_seconds", "time to decrypt one message")
+send_time = metrics.histogram("send_seconds", "time a message waited for the socket lock and sendall (excludes shaping)")
+
+_ciphers = {}   # key -> AESGCM, building the cypher every message is slow
+_send_locks = weakref.WeakKeyDictionary()   # socket -> lock so threads dont interleave messages
+_locks_guard = threading.Lock()
+
 # return 32 byte key
 def load_key() -> bytes:
 
@@ -25,53 +41,122 @@ def load_key() -> bytes:
     return key
 
 
+def cipher(key: bytes) -> AESGCM:
+    aes = _ciphers.get(key)
+    if aes is None:
+        aes = AESGCM(key)   # create aes cypher
+        _ciphers[key] = aes
+    return aes
+
 def seal(key: bytes, plaintext: bytes, aad: bytes = b"") -> bytes:
-    aes = AESGCM(key)   # create aes cypher
+    aes = cipher(key)
     nonce = os.urandom(12)  # create 12 byte nonce 
     ciphertext = aes.encrypt(nonce, plaintext, aad)     # encrypt plaintext
     return nonce + ciphertext
 
+# seal straight into out as a full frame [length][channel][nonce + ciphertext], returns frame size
+# out is grown if needed and can be reused between calls so large sends dont allocate
+def seal_into(key: bytes, payload, aad: bytes, out: bytearray) -> int:
+    n = 12 + len(payload) + 16
+    total = 5 + n
+
+    if len(out) < total:
+        out.extend(bytes(total - len(out)))
+
+    view = memoryview(out)
+    struct.pack_into("!IB", out, 0, n, CHANNELS[aad])
+    nonce = os.urandom(12)
+    view[5:17] = nonce
+
+    aes = cipher(key)
+    with seal_time.time():
+        if hasattr(aes, "encrypt_into"):
+            aes.encrypt_into(nonce, payload, aad, view[17:total])  # no intermediate ciphertext copy
+        else:
+            view[17:total] = aes.encrypt(nonce, bytes(payload), aad)
+
+    return total
+
 def unseal(key: bytes, blob: bytes, aad: bytes = b"") -> bytes:
-    aes = AESGCM(key)   # create aes cypher
-    nonce, ciphertext = blob[:12], blob[12:]    # seperate blob into nonce and ciphertext
-    return aes.decrypt(nonce, ciphertext, aad)  # decrypt ciphertext
+    aes = cipher(key)
+    view = memoryview(blob)
+    nonce, ciphertext = view[:12], view[12:]    # seperate blob into nonce and ciphertext
+    with open_time.time():
+        return aes.decrypt(nonce, ciphertext, aad)  # decrypt ciphertext
     
 
 # read exactly n bytes 
-def recvn(sock, n: int) -> Optional[bytes]:
-    buf = bytearray()
+def recvn(sock, n: int) -> Optional[bytearray]:
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
 
-    while len(buf) < n: # loop unitll buf has n bytes 
-        chunk = sock.recv(n - len(buf))
+    while got < n: # loop unitll buf has n bytes 
+        count = sock.recv_into(view[got:])   # fill in place, no per chunk copies
     
-        if not chunk:   # connection closed before n bytes recieved 
+        if not count:   # connection closed before n bytes recieved 
             return None
     
-        buf.extend(chunk)   # append chunk to buffer
+        got += count
     
-    return bytes(buf)
-
-# send encrypted packedge with 
+    return buf
+
+# lock shared by every thread sending on this socket
+def send_lock(sock) -> threading.Lock:
+    with _locks_guard:
+        lock = _send_locks.get(sock)
+        if lock is None:
+            lock = threading.Lock()
+            _send_locks[sock] = lock
+        return lock
+
+# send a frame made by seal_into
+def send_frame(sock, aad: bytes, frame) -> None:
+    shaper.throttle(aad, len(frame))   # wait for this traffic class's share of the link
+    with send_time.time(), send_lock(sock):
+        sock.sendall(frame)     # one call so the header and payload stay together
+
+# send encrypted packedge with [length][channel][nonce + ciphertext]
 def send_sealed(sock, key: bytes, payload: bytes, aad: bytes = b"") -> None:
-    blob = seal(key, payload, aad=aad)
-    sock.sendall(struct.pack("!I", len(blob)))  # send header
-    sock.sendall(blob)      # send payload
+    out = bytearray(5 + 12 + len(payload) + 16)
+    n = seal_into(key, payload, aad, out)
+    send_frame(sock, aad, memoryview(out)[:n])
 
-# recieve and decrypt
-def recv_open(sock, key: bytes, aad: bytes = b"") -> Optional[bytes]:
-    raw_len = recvn(sock, 4)    # read headder
+# decrypt a message whose [length][channel] header was already read, returns (aad, plaintext)
+def open_frame(key: bytes, chan: int, blob) -> tuple:
+    aad = CHANNEL_NAMES.get(chan)
+    if aad is None:
+        raise ValueError(f"Unknown channel {chan}")
+    return aad, unseal(key, blob, aad=aad)
+
+# recieve the next message on any channel, returns (aad, plaintext)
+def recv_any(sock, key: bytes):
+    raw_len = recvn(sock, 5)    # read headder
 
     if not raw_len:
-        return None
+        return None, None
 
-    (n,) = struct.unpack("!I", raw_len)     # get length of payload
+    n, chan = struct.unpack("!IB", raw_len)     # get length of payload
     blob = recvn(sock, n)   # read payload
 
     # catch empty recv
     if not blob:
+        return None, None
+
+    return open_frame(key, chan, blob)   # decrypt and return
+
+# recieve and decrypt
+def recv_open(sock, key: bytes, aad: bytes = b"") -> Optional[bytes]:
+    got, data = recv_any(sock, key)
+
+    if got is None:
         return None
 
-    return unseal(key, blob, aad=aad)   # decrypt and return
+    # channel is authenticated by the aad, this only catches protocol mixups
+    if got != aad:
+        raise ValueError(f"Expected {aad!r} message, got {got!r}")
+
+    return data
 
 
 # json helpers for control
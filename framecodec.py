@@ -0,0 +1,585 @@
+import zlib
+import time
+import struct
+import hashlib
+from collections import Counter, OrderedDict
+
+import numpy as np
+import cv2
+
+import metrics
+
+# video frames as a list of drawing ops against the canvas the client keeps
+#
+#   [magic 4][flags u8][width u16][height u16][op count u16] + ops
+#
+#   copy:   [1][src x u16][src y u16][w u16][h u16][dst x u16][dst y u16]
+#           move pixels the client already has, a scroll or a dragged window
+#   image:  [2][x u16][y u16][w u16][h u16][codec u8][length u32] + encoded bytes
+#   cache size:  [3][tiles u32]                                 first op of a keyframe
+#   store:  [4][x u16][y u16][w u16][h u16][hash 8]             keep this grid tile of the canvas under hash
+#   ref:    [5][x u16][y u16][hash 8]                           draw a kept tile again
+#
+# both ends keep the same lru of tiles: the server only mirrors hashes, the client holds pixels, and every store
+# and ref touches both in op order so evictions match without talking about them
+# a keyframe empties the cache, so any keyframe is a clean start (late joiners, recordings)
+# the client asks for a size with a "tile_cache" control message, the server's answer is the next keyframe
+#
+# each changed area is sent with the codec that suits it: text, code and flat ui (few colors, hard edges)
+# as a lossless palette, photos and video as jpeg / webp at the stream quality
+#   palette: [colors u16][colors * bgr, most used first] + zlib(index per pixel)
+#            indexes are u8, or with over 256 colors all the high bytes and then all the low bytes
+#
+# refinement: areas sent lossy at the stream quality are sent again at REFINE_QUALITY (text lossless) once they
+# have been still for REFINE_AFTER seconds, a few tiles per frame and only while little else is changing
+#
+# ops are applied in order, so every frame has to be applied (none can be skipped)
+# a keyframe replaces the whole canvas and can be shown on its own, plain jpeg / webp frames still decode as before
+
+MAGIC = b"RPF1"
+HEAD = struct.Struct("!4sBHHH")
+COPY = struct.Struct("!BHHHHHH")
+IMAGE = struct.Struct("!BHHHHBI")
+
+FLAG_KEY = 1
+
+OP_COPY = 1
+OP_IMAGE = 2
+OP_CACHE_SIZE = 3
+OP_STORE = 4
+OP_REF = 5
+
+CACHE_SIZE = struct.Struct("!BI")
+STORE = struct.Struct("!BHHHH8s")
+REF = struct.Struct("!BHH8s")
+
+CACHE_TILES = 2048      # what clients ask for, 64 x 64 bgr tiles is about 24 MB
+CACHE_MAX_TILES = 4096  # most the server agrees to
+
+CODEC_JPEG = 0
+CODEC_WEBP = 1
+CODEC_PALETTE = 2
+CODECS = {"jpeg": CODEC_JPEG, "webp": CODEC_WEBP}     # the lossy codec, picked in stream settings
+
+PALETTE_HEAD = struct.Struct("!H")
+PALETTE_MAX = 4096      # more colors than this is not text, the area goes out lossy instead
+PALETTE_SPARSE = 64     # over 1024 colors there should be at least this many pixels per color (photo edges are not)
+PALETTE_LEVEL = 6       # zlib level, text areas are small and compress a lot better than at 1
+
+KIND_PHOTO = 1
+KIND_TEXT = 2
+TEXT_COLORS = 64        # distinct colors in a tile's 256 samples, at or under this it is text-like
+
+TILE = 64               # changed areas are found on this grid
+MIN_SHIFT_LINES = 32    # a translation has to move at least this many rows / columns to be worth a copy
+MAX_SHIFT = 0.75        # of the changed area, how far a scroll is searched for
+MAX_REPEATS = 4         # lines seen more often than this in one frame do not vote for a shift
+
+REFINE_AFTER = 0.75     # seconds a lossy tile has to stay unchanged before it is sent again
+REFINE_QUALITY = 92     # quality of the second send (text areas go lossless)
+REFINE_TILES = 12       # most tiles refined per frame, keeps refinement to spare bandwidth
+REFINE_BUSY = 0.1       # no refinement in frames where more than this share of tiles changed
+
+copies_sent = metrics.counter("copy_rects", "scrolls and window moves sent as copies")
+keyframes_sent = metrics.counter("keyframes", "video frames that redraw the whole canvas")
+text_rects = metrics.counter("text_rects", "changed areas sent lossless as a palette")
+refined_tiles = metrics.counter("refined_tiles", "still tiles resent at high quality")
+cache_hits = metrics.counter("tile_cache_hits", "tiles drawn from the client's tile cache instead of being sent")
+
+
+def is_op_frame(data) -> bool:
+    return bytes(data[:4]) == MAGIC
+
+
+# can be drawn without any earlier frame
+def is_keyframe(data) -> bool:
+    return not is_op_frame(data) or bool(data[4] & FLAG_KEY)
+
+
+def encode_image(img, codec: int, quality: int) -> bytes | None:
+    if codec == CODEC_WEBP:
+        ok, enc = cv2.imencode(".webp", img, [int(cv2.IMWRITE_WEBP_QUALITY), quality])
+    else:
+        ok, enc = cv2.imencode(".jpg", img, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+    return enc.tobytes() if ok else None
+
+
+# every pixel as one uint32 (b | g << 8 | r << 16), little endian like the machines this runs on
+def pack_pixels(img):
+    return cv2.cvtColor(img, cv2.COLOR_BGR2BGRA).view(np.uint32)[..., 0] & 0xFFFFFF
+
+
+# lossless, the colors once and then an index per pixel
+# lut is a 2^24 entry scratch table (color -> index), kept by the caller so it is not reallocated per area
+def encode_palette(img, lut) -> bytes | None:
+
+    packed = pack_pixels(img).ravel()
+    ordered = np.sort(packed)
+    starts = np.flatnonzero(np.concatenate(([True], ordered[1:] != ordered[:-1])))
+    n = len(starts)
+    if n > PALETTE_MAX or n > max(1024, len(packed) // PALETTE_SPARSE):
+        return None
+
+    # most used colors get the small indexes, so anti-aliased text over 256 colors has mostly zero high bytes
+    counts = np.diff(np.append(starts, len(ordered)))
+    colors = ordered[starts][np.argsort(-counts, kind="stable")]
+
+    lut[colors] = np.arange(len(colors), dtype=lut.dtype)
+    index = lut[packed]
+    if len(colors) <= 256:
+        raw = index.astype(np.uint8).tobytes()
+    else:
+        raw = (index >> 8).astype(np.uint8).tobytes() + index.astype(np.uint8).tobytes()
+
+    palette = colors.view(np.uint8).reshape(-1, 4)[:, :3]
+    return PALETTE_HEAD.pack(len(colors)) + palette.tobytes() + zlib.compress(raw, PALETTE_LEVEL)
+
+
+def decode_palette(data, w: int, h: int):
+
+    (n,) = PALETTE_HEAD.unpack_from(data)
+    pos = PALETTE_HEAD.size
+    palette = np.frombuffer(data, np.uint8, n * 3, pos).reshape(n, 3)
+    raw = np.frombuffer(zlib.decompress(data[pos + n * 3:]), np.uint8)
+    if n > 256:
+        if raw.size != 2 * w * h:
+            return None
+        index = raw[:w * h].astype(np.uint16) << 8 | raw[w * h:]
+    else:
+        index = raw
+    if index.size != w * h or (n and index.max() >= n):
+        return None
+    return palette[index].reshape(h, w, 3)
+
+
+# pixels that differ between two frames, as an (h, w) bool array
+# (or-ing the channel planes is several times faster than any(axis=2))
+def changed_pixels(a, b):
+    ne = a != b
+    return ne[..., 0] | ne[..., 1] | ne[..., 2]
+
+
+# hash of every line of a block, rows of a (h, w, 3) array
+def line_hashes(block) -> list:
+    return [hash(line.tobytes()) for line in block]
+
+
+# dominant offset between two lists of line hashes, only lines that are rare in prev vote
+# (blank lines match everywhere and say nothing about where things moved)
+def find_shift(prev_lines: list, cur_lines: list, max_shift: int) -> int:
+
+    where = {}
+    for i, h in enumerate(prev_lines):
+        where.setdefault(h, []).append(i)
+
+    votes = Counter()
+    for y, h in enumerate(cur_lines):
+        found = where.get(h)
+        if found is None or len(found) > MAX_REPEATS:
+            continue
+        for p in found:
+            if p != y and abs(y - p) <= max_shift:
+                votes[y - p] += 1
+
+    if not votes:
+        return 0
+    shift, n = votes.most_common(1)[0]
+    return shift if n >= MIN_SHIFT_LINES // 4 else 0
+
+
+# longest run of lines where cur[i] == prev[i - shift], as (start, end)
+def longest_match(prev_lines: list, cur_lines: list, shift: int) -> tuple:
+
+    best = (0, 0)
+    start = None
+    for i in range(len(cur_lines) + 1):
+        j = i - shift
+        same = i < len(cur_lines) and 0 <= j < len(prev_lines) and cur_lines[i] == prev_lines[j]
+        if same and start is None:
+            start = i
+        elif not same and start is not None:
+            if i - start > best[1] - best[0]:
+                best = (start, i)
+            start = None
+    return best
+
+
+# which tiles of the grid have any changed pixel
+def tile_grid(changed, tile: int = TILE):
+    h, w = changed.shape
+    rows = np.logical_or.reduceat(changed, np.arange(0, h, tile), axis=0)
+    return np.logical_or.reduceat(rows, np.arange(0, w, tile), axis=1)
+
+
+# kind of every tile, 0 for tiles that did not change
+# text, code and flat ui use few colors, counted on a 16 x 16 sample of each tile (all tiles sorted at once)
+def classify_tiles(frame, dirty, tile: int = TILE):
+
+    step = tile // 16
+    th, tw = dirty.shape
+    sub = pack_pixels(np.ascontiguousarray(frame[::step, ::step]))
+    sub = np.pad(sub, ((0, th * 16 - sub.shape[0]), (0, tw * 16 - sub.shape[1])), mode="edge")
+
+    blocks = np.sort(sub.reshape(th, 16, tw, 16).swapaxes(1, 2).reshape(th, tw, 256), axis=2)
+    distinct = 1 + np.count_nonzero(blocks[..., 1:] != blocks[..., :-1], axis=2)
+
+    kinds = np.where(distinct <= TEXT_COLORS, KIND_TEXT, KIND_PHOTO).astype(np.uint8)
+    kinds[~dirty] = 0
+    return kinds
+
+
+# tiles of the same kind merged into rectangles (x, y, w, h, kind): runs along a tile row, then equal runs down the rows
+def tile_rects(kinds, w: int, h: int, tile: int = TILE) -> list:
+
+    open_runs = {}      # (first col, last col, kind) -> [x, y, w, h, kind] still growing downwards
+    rects = []
+    for ty in range(kinds.shape[0]):
+        runs = []
+        row = kinds[ty]
+        tx = 0
+        while tx < len(row):
+            kind = row[tx]
+            end = tx
+            while end + 1 < len(row) and row[end + 1] == kind:
+                end += 1
+            if kind:
+                runs.append((tx, end, int(kind)))
+            tx = end + 1
+
+        y = ty * tile
+        rh = min(tile, h - y)
+        grown = {}
+        for run in runs:
+            rect = open_runs.pop(run, None)
+            if rect is None:
+                x = run[0] * tile
+                rect = [x, y, min((run[1] + 1) * tile, w) - x, 0, run[2]]
+            rect[3] += rh
+            grown[run] = rect
+        rects.extend(open_runs.values())
+        open_runs = grown
+    rects.extend(open_runs.values())
+
+    return [tuple(r) for r in rects]
+
+
+# server side, one per video stream
+class FrameEncoder:
+
+    def __init__(self):
+        self.prev = None        # last frame sent, what the client canvas shows (before compression)
+        self.force_key = True
+        self.lut = np.zeros(1 << 24, np.uint16)    # palette scratch table, pages are only touched as colors are seen
+        self.lossy = None       # per tile, the client has it at less than REFINE_QUALITY
+        self.changed_at = None  # per tile, monotonic time of the last change
+        self.cache = OrderedDict()  # hash -> lossy, mirror of the client's tile cache, oldest first
+        self.cache_size = 0         # tiles, 0 = off untill the client asks for a cache
+        self.cache_wanted = 0       # agreed size, takes effect with the next keyframe
+        self.hashes = {}            # (ty, tx) -> hash of the frame being encoded
+
+    # next frame replaces the whole canvas, asked for by the client when it needs a clean start
+    def request_keyframe(self):
+        self.force_key = True
+
+    # the client's tile cache size, capped by ours
+    def set_cache_size(self, tiles: int):
+        self.cache_wanted = max(0, min(int(tiles), CACHE_MAX_TILES))
+        self.force_key = True
+
+    def encode(self, frame, quality: int, codec: str = "jpeg") -> bytes | None:
+
+        codec_id = CODECS.get(codec, CODEC_JPEG)
+        h, w = frame.shape[:2]
+        prev = self.prev
+        now = time.monotonic()
+        self.hashes = {}
+
+        if self.force_key or prev is None or prev.shape != frame.shape:
+            return self.keyframe(frame, quality, codec_id, now)
+
+        ops = []
+        changed = changed_pixels(frame, prev)
+        ys = np.flatnonzero(changed.any(axis=1))
+        if len(ys):
+            xs = np.flatnonzero(changed.any(axis=0))
+            x0, x1, y0, y1 = int(xs[0]), int(xs[-1]) + 1, int(ys[0]), int(ys[-1]) + 1
+
+            # a scroll or window move turns most of the changed area into a copy of what the client already has
+            copy = self.find_copy(prev, frame, x0, x1, y0, y1)
+            if copy is not None:
+                sx, sy, cw, ch, dx, dy = copy
+                ops.append(COPY.pack(OP_COPY, sx, sy, cw, ch, dx, dy))
+                # what is left to send after the copy, the copy always lands inside the changed box
+                base = prev[y0:y1, x0:x1].copy()
+                base[dy - y0:dy - y0 + ch, dx - x0:dx - x0 + cw] = prev[sy:sy + ch, sx:sx + cw]
+                changed[y0:y1, x0:x1] = changed_pixels(frame[y0:y1, x0:x1], base)
+                self.move_tiles(copy, now)
+                copies_sent.inc()
+
+            dirty = tile_grid(changed)
+        else:
+            dirty = np.zeros(self.lossy.shape, bool)
+
+        # tiles the client still has are drawn from its cache
+        ops += self.use_cache(frame, dirty, now)
+
+        kinds = classify_tiles(frame, dirty)
+        images = self.encode_areas(frame, kinds, quality, codec_id, now)
+        if images is None:
+            self.force_key = True   # the cache mirror may have moved on without the client, start over
+            return None
+        ops += images + self.store_tiles(frame, kinds)
+
+        # spare room in this frame, resend still areas at high quality
+        if dirty.mean() <= REFINE_BUSY:
+            ops += self.refine(frame, dirty, codec_id, now) or []
+
+        self.prev = frame
+        return HEAD.pack(MAGIC, 0, w, h, len(ops)) + b"".join(ops)
+
+    def keyframe(self, frame, quality: int, codec_id: int, now: float) -> bytes | None:
+
+        h, w = frame.shape[:2]
+        everything = np.ones((-(-h // TILE), -(-w // TILE)), bool)
+        self.lossy = np.zeros(everything.shape, bool)
+        self.changed_at = np.zeros(everything.shape)
+        self.cache.clear()
+        self.cache_size = self.cache_wanted
+
+        kinds = classify_tiles(frame, everything)
+        ops = self.encode_areas(frame, kinds, quality, codec_id, now)
+        if ops is None:
+            return None
+        ops = [CACHE_SIZE.pack(OP_CACHE_SIZE, self.cache_size)] + ops + self.store_tiles(frame, kinds)
+
+        self.prev = frame
+        self.force_key = False
+        keyframes_sent.inc()
+        return HEAD.pack(MAGIC, FLAG_KEY, w, h, len(ops)) + b"".join(ops)
+
+    # one image op per rectangle of same kind tiles, text as a palette when it has few enough colors
+    def encode_areas(self, frame, kinds, quality: int, codec_id: int, now: float) -> list | None:
+
+        h, w = frame.shape[:2]
+        ops = []
+        for x, y, rw, rh, kind in tile_rects(kinds, w, h):
+            img = frame[y:y + rh, x:x + rw]
+
+            data = None
+            if kind == KIND_TEXT:
+                data, codec = encode_palette(img, self.lut), CODEC_PALETTE
+                if data is not None:
+                    text_rects.inc()
+            if data is None:
+                data, codec = encode_image(img, codec_id, quality), codec_id
+                if data is None:
+                    return None
+
+            tiles = np.s_[y // TILE:-(-(y + rh) // TILE), x // TILE:-(-(x + rw) // TILE)]
+            self.lossy[tiles] = codec != CODEC_PALETTE and quality < REFINE_QUALITY
+            self.changed_at[tiles] = now
+
+            ops.append(IMAGE.pack(OP_IMAGE, x, y, rw, rh, codec, len(data)) + data)
+        return ops
+
+    def tile_hash(self, frame, ty: int, tx: int) -> bytes:
+
+        key = self.hashes.get((ty, tx))
+        if key is None:
+            tile = frame[ty * TILE:(ty + 1) * TILE, tx * TILE:(tx + 1) * TILE]
+            h = hashlib.blake2b(struct.pack("!HH", *tile.shape[:2]), digest_size=8)
+            h.update(tile.tobytes())
+            key = self.hashes[(ty, tx)] = h.digest()
+        return key
+
+    # ref ops for changed tiles the client has cached, those are taken out of dirty
+    def use_cache(self, frame, dirty, now: float) -> list:
+
+        if not self.cache_size:
+            return []
+
+        ops = []
+        for ty, tx in zip(*np.nonzero(dirty)):
+            key = self.tile_hash(frame, ty, tx)
+            lossy = self.cache.get(key)
+            if lossy is None:
+                continue
+            self.cache.move_to_end(key)
+            dirty[ty, tx] = False
+            self.lossy[ty, tx] = lossy
+            self.changed_at[ty, tx] = now
+            ops.append(REF.pack(OP_REF, tx * TILE, ty * TILE, key))
+            cache_hits.inc()
+        return ops
+
+    # store ops for every tile just sent, after the images so the client caches what it drew
+    def store_tiles(self, frame, kinds) -> list:
+
+        if not self.cache_size:
+            return []
+
+        h, w = frame.shape[:2]
+        ops = []
+        for ty, tx in zip(*np.nonzero(kinds)):
+            key = self.tile_hash(frame, ty, tx)
+            self.cache[key] = bool(self.lossy[ty, tx])
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+            x, y = tx * TILE, ty * TILE
+            ops.append(STORE.pack(OP_STORE, x, y, min(TILE, w - x), min(TILE, h - y), key))
+        return ops
+
+    # tiles a copy wrote to carry the lossy state of where they came from, and count as just changed
+    def move_tiles(self, copy: tuple, now: float):
+
+        sx, sy, cw, ch, dx, dy = copy
+        lossy = self.lossy.copy()
+        for ty in range(dy // TILE, (dy + ch - 1) // TILE + 1):
+            for tx in range(dx // TILE, (dx + cw - 1) // TILE + 1):
+                # the part of this tile the copy covers, in source coordinates
+                x0 = max(tx * TILE, dx) - dx + sx
+                x1 = min((tx + 1) * TILE, dx + cw) - dx + sx
+                y0 = max(ty * TILE, dy) - dy + sy
+                y1 = min((ty + 1) * TILE, dy + ch) - dy + sy
+                lossy[ty, tx] |= self.lossy[y0 // TILE:(y1 - 1) // TILE + 1, x0 // TILE:(x1 - 1) // TILE + 1].any()
+                self.changed_at[ty, tx] = now
+        self.lossy = lossy
+
+    # lossy tiles that have been still long enough, longest still first, at most REFINE_TILES
+    def refine(self, frame, dirty, codec_id: int, now: float) -> list | None:
+
+        ready = self.lossy & ~dirty & (now - self.changed_at >= REFINE_AFTER)
+        if not ready.any():
+            return []
+
+        picked = np.zeros(ready.shape, bool)
+        order = np.argsort(np.where(ready, self.changed_at, np.inf), axis=None)[:min(REFINE_TILES, int(ready.sum()))]
+        picked.flat[order] = True
+
+        kinds = classify_tiles(frame, picked)
+        ops = self.encode_areas(frame, kinds, REFINE_QUALITY, codec_id, now)
+        if ops:
+            refined_tiles.inc(len(order))
+            ops += self.store_tiles(frame, kinds)     # the better copy replaces the cached one
+        return ops
+
+    # vertical translation first (scrolling), then horizontal, inside the changed box
+    # returns (src x, src y, w, h, dst x, dst y) or None
+    def find_copy(self, prev, cur, x0: int, x1: int, y0: int, y1: int):
+
+        if y1 - y0 >= MIN_SHIFT_LINES:
+            prev_lines = line_hashes(prev[:, x0:x1])
+            cur_lines = line_hashes(cur[y0:y1, x0:x1])
+            shift = find_shift(prev_lines, [None] * y0 + cur_lines, int((y1 - y0) * MAX_SHIFT))
+            if shift:
+                a, b = longest_match(prev_lines, [None] * y0 + cur_lines, shift)
+                if b - a >= MIN_SHIFT_LINES:
+                    return x0, a - shift, x1 - x0, b - a, x0, a
+
+        if x1 - x0 >= MIN_SHIFT_LINES:
+            prev_lines = line_hashes(prev[y0:y1, :].transpose(1, 0, 2))
+            cur_lines = line_hashes(cur[y0:y1, x0:x1].transpose(1, 0, 2))
+            shift = find_shift(prev_lines, [None] * x0 + cur_lines, int((x1 - x0) * MAX_SHIFT))
+            if shift:
+                a, b = longest_match(prev_lines, [None] * x0 + cur_lines, shift)
+                if b - a >= MIN_SHIFT_LINES:
+                    return a - shift, y0, b - a, y1 - y0, a, y0
+
+        return None
+
+
+# client side, the retained canvas
+# parse() decodes the images and is safe to run on any thread, apply() has to see every frame in order
+class FrameDecoder:
+
+    def __init__(self):
+        self.canvas = None
+        self.cache = OrderedDict()  # hash -> tile pixels, kept in step with the server's mirror
+        self.cache_size = 0
+
+    # (flags, w, h, ops) with images decoded, or None if the frame is broken
+    def parse(self, data):
+
+        data = memoryview(data)
+        try:
+            _, flags, w, h, count = HEAD.unpack_from(data)
+            pos = HEAD.size
+            ops = []
+            for _ in range(count):
+                op = data[pos]
+                if op == OP_COPY:
+                    ops.append(COPY.unpack_from(data, pos))
+                    pos += COPY.size
+                elif op == OP_IMAGE:
+                    _, x, y, iw, ih, codec, length = IMAGE.unpack_from(data, pos)
+                    pos += IMAGE.size
+                    if codec == CODEC_PALETTE:
+                        img = decode_palette(data[pos:pos + length], iw, ih)
+                    else:
+                        img = cv2.imdecode(np.frombuffer(data[pos:pos + length], np.uint8), cv2.IMREAD_COLOR)
+                    pos += length
+                    if img is None or img.shape[:2] != (ih, iw):
+                        return None
+                    ops.append((OP_IMAGE, x, y, img))
+                elif op == OP_CACHE_SIZE:
+                    ops.append(CACHE_SIZE.unpack_from(data, pos))
+                    pos += CACHE_SIZE.size
+                elif op == OP_STORE:
+                    ops.append(STORE.unpack_from(data, pos))
+                    pos += STORE.size
+                elif op == OP_REF:
+                    ops.append(REF.unpack_from(data, pos))
+                    pos += REF.size
+                else:
+                    return None
+        except (struct.error, IndexError, ValueError, zlib.error):
+            return None
+        return flags, w, h, ops
+
+    # draw one parsed frame, returns the canvas (which the next frame changes, copy it to keep it)
+    def apply(self, parsed):
+
+        flags, w, h, ops = parsed
+        canvas = self.canvas
+        if flags & FLAG_KEY or canvas is None or canvas.shape[:2] != (h, w):
+            if not flags & FLAG_KEY:
+                return None     # a delta without the frame it is based on, wait for a keyframe
+            canvas = self.canvas = np.zeros((h, w, 3), np.uint8)
+            self.cache.clear()
+
+        for op in ops:
+            kind = op[0]
+            if kind == OP_COPY:
+                _, sx, sy, cw, ch, dx, dy = op
+                canvas[dy:dy + ch, dx:dx + cw] = canvas[sy:sy + ch, sx:sx + cw]
+            elif kind == OP_IMAGE:
+                _, x, y, img = op
+                canvas[y:y + img.shape[0], x:x + img.shape[1]] = img
+            elif kind == OP_CACHE_SIZE:
+                self.cache_size = op[1]
+            elif kind == OP_STORE:
+                _, x, y, tw, th, key = op
+                self.cache[key] = canvas[y:y + th, x:x + tw].copy()
+                self.cache.move_to_end(key)
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+            else:
+                _, x, y, key = op
+                tile = self.cache.get(key)
+                if tile is None:
+                    self.canvas = None  # out of step with the server, nothing is right untill the next keyframe
+                    return None
+                self.cache.move_to_end(key)
+                canvas[y:y + tile.shape[0], x:x + tile.shape[1]] = tile
+
+        return canvas
+
+    # any video payload to a frame, for playing recordings
+    def decode(self, data):
+
+        if not is_op_frame(data):
+            return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+        parsed = self.parse(data)
+        return None if parsed is None else self.apply(parsed)
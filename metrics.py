@@ -0,0 +1,200 @@
+import time
+import bisect
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# process wide counters, gauges and histograms
+# cheap enough to leave on: an update is a lock and an add, nothing is formatted untill someone asks
+
+PREFIX = "remotepc_"
+METRICS_PORT = 9105     # only served when asked for, on localhost
+
+# seconds, from well under a millisecond to a slow frame
+TIME_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+# bytes, a tiny delta frame up to a large full frame
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 131072, 262144, 524288, 1048576, 4194304)
+
+_lock = threading.Lock()
+_metrics = {}   # name -> metric, in creation order
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        self.name, self.help = name, help
+        self.lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, n: float = 1):
+        with self.lock:
+            self.value += n
+
+    def samples(self):
+        yield self.name + "_total", self.value
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn=None):
+        self.name, self.help = name, help
+        self.fn = fn    # read the value when scraped instead of setting it
+        self.value = 0
+
+    def set(self, v: float):
+        self.value = v
+
+    def samples(self):
+        if self.fn is not None:
+            try:
+                self.value = self.fn()
+            except Exception:
+                pass
+        yield self.name, self.value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets=TIME_BUCKETS):
+        self.name, self.help = name, help
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.counts = [0] * (len(self.buckets) + 1)     # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, v: float):
+        i = bisect.bisect_left(self.buckets, v)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += v
+            self.count += 1
+
+    # with hist.time(): ... observes the seconds spent inside
+    def time(self):
+        return _Timer(self)
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def samples(self):
+        with self.lock:
+            counts, total, n = list(self.counts), self.sum, self.count
+        running = 0
+        for bound, c in zip(self.buckets + (float("inf"),), counts):
+            running += c
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            yield f'{self.name}_bucket{{le="{le}"}}', running
+        yield self.name + "_sum", total
+        yield self.name + "_count", n
+
+
+class _Timer:
+
+    def __init__(self, hist: Histogram):
+        self.hist = hist
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.start)
+
+
+# get or create, so modules can declare the metrics they use at import time
+def _get(cls, name: str, help: str, **kwargs):
+    name = PREFIX + name
+    with _lock:
+        metric = _metrics.get(name)
+        if metric is None:
+            metric = _metrics[name] = cls(name, help, **kwargs)
+        return metric
+
+
+def counter(name: str, help: str) -> Counter:
+    return _get(Counter, name, help)
+
+
+def gauge(name: str, help: str, fn=None) -> Gauge:
+    g = _get(Gauge, name, help)
+    if fn is not None:
+        g.fn = fn
+    return g
+
+
+def histogram(name: str, help: str, buckets=TIME_BUCKETS) -> Histogram:
+    return _get(Histogram, name, help, buckets=buckets)
+
+
+# prometheus text exposition format
+def render() -> str:
+
+    with _lock:
+        metrics = list(_metrics.values())
+
+    lines = []
+    for m in metrics:
+        lines.append(f"# HELP {m.name} {m.help}")
+        lines.append(f"# TYPE {m.name} {m.kind}")
+        for name, value in m.samples():
+            lines.append(f"{name} {value:g}" if isinstance(value, float) else f"{name} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+# short lines for the ui stats panel, only metrics that have seen data
+def summary() -> list:
+
+    with _lock:
+        metrics = list(_metrics.values())
+
+    lines = []
+    for m in metrics:
+        short = m.name[len(PREFIX):]
+        if isinstance(m, Histogram):
+            if m.count:
+                unit = "ms" if m.buckets == TIME_BUCKETS else "KB"
+                mean = m.mean * 1000 if unit == "ms" else m.mean / 1024
+                lines.append(f"{short}: avg {mean:.2f} {unit} ({m.count})")
+        else:
+            value = next(m.samples())[1]
+            if value:
+                lines.append(f"{short}: {value:.1f}" if isinstance(value, float) else f"{short}: {value}")
+
+    return lines
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass    # scrapes every few seconds would flood the console
+
+
+_server = None
+
+# start the http endpoint (once per process), returns the port it listens on
+def serve(port: int = METRICS_PORT, host: str = "127.0.0.1") -> int:
+
+    global _server
+    with _lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _Handler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+        return _server.server_address[1]
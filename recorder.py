@@ -0,0 +1,321 @@
+import os
+import sys
+import time
+import struct
+import bisect
+import threading
+
+# session recording, the already encoded video frames are appended as they arrive (no re-encode)
+#
+# file layout:
+#   MAGIC
+#   chunk*      CHUNK_HEAD [frame count][byte length][first ts]  then frames: [ts][length][data]
+#   index       INDEX_HEAD [chunk count]  then per chunk: [first ts][last ts][file offset]
+#   footer      [index offset][FOOTER]
+#
+# the player seeks with the index, a file cut short by a crash is re-indexed from the chunk headers
+# frames can be deltas (see framecodec.py), seeking replays from the keyframe before the wanted time
+
+MAGIC = b"RPCREC1\n"
+CHUNK_HEAD = b"CHNK"
+INDEX_HEAD = b"INDX"
+FOOTER = b"RPCIDX\0\0"
+
+CHUNK_STRUCT = struct.Struct("!4sIQd")      # head, frames, bytes, first ts
+FRAME_STRUCT = struct.Struct("!dI")         # ts, length
+INDEX_STRUCT = struct.Struct("!ddQ")        # first ts, last ts, offset
+FOOTER_STRUCT = struct.Struct("!Q8s")       # index offset, footer
+
+CHUNK_BYTES = 4 * 1024 * 1024   # frames buffered before a chunk is written
+CHUNK_SECONDS = 2.0             # or this much time, whichever comes first
+
+
+# appends encoded frames to a recording file, memory use is one chunk
+class Recorder:
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.f = open(path, "wb")
+        self.f.write(MAGIC)
+        self.lock = threading.Lock()
+        self.start = time.monotonic()
+        self.index = []         # (first ts, last ts, offset) per chunk
+        self.frames = []        # (ts, data) waiting for the next chunk write
+        self.pending = 0        # bytes in self.frames
+        self.count = 0          # frames recorded
+
+    # called with every video payload as it comes off the socket
+    def add(self, data: bytes, ts: float | None = None):
+
+        if ts is None:
+            ts = time.monotonic() - self.start
+
+        with self.lock:
+            if self.f is None:
+                return
+            self.frames.append((ts, data))
+            self.pending += len(data) + FRAME_STRUCT.size
+            self.count += 1
+
+            if self.pending >= CHUNK_BYTES or ts - self.frames[0][0] >= CHUNK_SECONDS:
+                self.flush_chunk()
+
+    # write buffered frames as one chunk (lock must be held)
+    def flush_chunk(self):
+
+        if not self.frames:
+            return
+
+        offset = self.f.tell()
+        first, last = self.frames[0][0], self.frames[-1][0]
+
+        self.f.write(CHUNK_STRUCT.pack(CHUNK_HEAD, len(self.frames), self.pending, first))
+        for ts, data in self.frames:
+            self.f.write(FRAME_STRUCT.pack(ts, len(data)))
+            self.f.write(data)
+
+        self.index.append((first, last, offset))
+        self.frames = []
+        self.pending = 0
+
+    # finish the file with its index
+    def close(self):
+
+        with self.lock:
+            if self.f is None:
+                return
+
+            self.flush_chunk()
+
+            index_offset = self.f.tell()
+            self.f.write(INDEX_HEAD + struct.pack("!I", len(self.index)))
+            for entry in self.index:
+                self.f.write(INDEX_STRUCT.pack(*entry))
+            self.f.write(FOOTER_STRUCT.pack(index_offset, FOOTER))
+
+            self.f.close()
+            self.f = None
+
+    @property
+    def duration(self) -> float:
+        return time.monotonic() - self.start
+
+
+# random access to a recording by time
+class Player:
+
+    def __init__(self, path: str):
+        self.f = open(path, "rb")
+        if self.f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a recording")
+
+        self.cache = (None, [])     # last chunk read, (offset, frames)
+        self.index = self.read_index() or self.rebuild_index()
+        self.starts = [first for first, _, _ in self.index]
+
+    def read_index(self) -> list | None:
+
+        self.f.seek(0, os.SEEK_END)
+        end = self.f.tell()
+        if end < len(MAGIC) + FOOTER_STRUCT.size:
+            return None
+
+        self.f.seek(end - FOOTER_STRUCT.size)
+        index_offset, footer = FOOTER_STRUCT.unpack(self.f.read(FOOTER_STRUCT.size))
+        if footer != FOOTER:
+            return None     # recording was not closed cleanly
+
+        self.f.seek(index_offset)
+        if self.f.read(4) != INDEX_HEAD:
+            return None
+        (count,) = struct.unpack("!I", self.f.read(4))
+
+        data = self.f.read(count * INDEX_STRUCT.size)
+        return [INDEX_STRUCT.unpack_from(data, i * INDEX_STRUCT.size) for i in range(count)]
+
+    # walk the chunk headers of a file that was not closed cleanly
+    def rebuild_index(self) -> list:
+
+        index = []
+        offset = len(MAGIC)
+
+        while True:
+            self.f.seek(offset)
+            head = self.f.read(CHUNK_STRUCT.size)
+            if len(head) < CHUNK_STRUCT.size:
+                break
+
+            tag, count, length, first = CHUNK_STRUCT.unpack(head)
+            if tag != CHUNK_HEAD:
+                break
+
+            frames = self.read_chunk(offset)
+            if len(frames) < count:
+                break   # chunk cut off part way
+
+            index.append((first, frames[-1][0], offset))
+            offset += CHUNK_STRUCT.size + length
+
+        return index
+
+    # all (ts, data) of the chunk at offset
+    def read_chunk(self, offset: int) -> list:
+
+        if self.cache[0] == offset:
+            return self.cache[1]
+
+        self.f.seek(offset)
+        _, count, length, _ = CHUNK_STRUCT.unpack(self.f.read(CHUNK_STRUCT.size))
+        data = self.f.read(length)
+
+        frames = []
+        pos = 0
+        for _ in range(count):
+            if pos + FRAME_STRUCT.size > len(data):
+                break
+            ts, n = FRAME_STRUCT.unpack_from(data, pos)
+            pos += FRAME_STRUCT.size
+            if pos + n > len(data):
+                break
+            frames.append((ts, data[pos:pos + n]))
+            pos += n
+
+        self.cache = (offset, frames)
+        return frames
+
+    @property
+    def duration(self) -> float:
+        return self.index[-1][1] if self.index else 0.0
+
+    # latest frame at or before t seconds, returns (ts, data) or None
+    def frame_at(self, t: float):
+
+        if not self.index:
+            return None
+
+        i = max(0, bisect.bisect_right(self.starts, t) - 1)
+        frames = self.read_chunk(self.index[i][2])
+        if not frames:
+            return None
+
+        j = max(0, bisect.bisect_right([ts for ts, _ in frames], t) - 1)
+        return frames[j]
+
+    # every frame from t onwards, in order
+    def frames_from(self, t: float = 0.0):
+
+        i = max(0, bisect.bisect_right(self.starts, t) - 1)
+        for _, _, offset in self.index[i:]:
+            for ts, data in self.read_chunk(offset):
+                if ts >= t:
+                    yield ts, data
+
+    # (chunk, frame) of the last frame at or before t that draws without earlier frames
+    def keyframe_before(self, t: float) -> tuple:
+
+        import framecodec
+
+        i = max(0, bisect.bisect_right(self.starts, t) - 1)
+        while i >= 0:
+            frames = self.read_chunk(self.index[i][2])
+            for j in range(len(frames) - 1, -1, -1):
+                if frames[j][0] <= t and framecodec.is_keyframe(frames[j][1]):
+                    return i, j
+            i -= 1
+        return 0, 0
+
+    # decoded (ts, frame) from the keyframe before t onwards, frames are only valid untill the next one
+    def decode_from(self, t: float = 0.0):
+
+        import framecodec
+
+        if not self.index:
+            return
+
+        decoder = framecodec.FrameDecoder()
+        first, skip = self.keyframe_before(t)
+        for i in range(first, len(self.index)):
+            frames = self.read_chunk(self.index[i][2])
+            for ts, data in frames[skip if i == first else 0:]:
+                frame = decoder.decode(data)
+                if frame is not None:
+                    yield ts, frame
+
+    # decoded frames from t onwards
+    def images_from(self, t: float = 0.0):
+        for ts, frame in self.decode_from(t):
+            if ts >= t:
+                yield ts, frame
+
+    # latest decoded frame at or before t, returns (ts, frame) or None
+    def image_at(self, t: float):
+
+        found = None
+        for ts, frame in self.decode_from(t):
+            if ts > t and found is not None:
+                break
+            found = ts, frame.copy()
+        return found
+
+    def close(self):
+        self.f.close()
+
+
+# play a recording in an opencv window, the slider seeks
+def play(path: str):
+
+    import cv2
+
+    player = Player(path)
+    window = os.path.basename(path)
+    seek = {"t": None}
+
+    cv2.namedWindow(window, cv2.WINDOW_NORMAL)
+    cv2.createTrackbar("seconds", window, 0, max(1, int(player.duration)), lambda v: seek.update(t=float(v)))
+
+    t = 0.0
+    while True:
+        wall = time.monotonic() - t
+        for ts, frame in player.images_from(t):
+
+            cv2.imshow(window, frame)
+
+            # keep the recorded timing
+            delay = max(1, int((ts - (time.monotonic() - wall)) * 1000))
+            key = cv2.waitKey(delay)
+            if key in (27, ord("q")) or cv2.getWindowProperty(window, cv2.WND_PROP_VISIBLE) < 1:
+                player.close()
+                cv2.destroyAllWindows()
+                return
+
+            if seek["t"] is not None:
+                break
+
+        if seek["t"] is None:
+            break   # reached the end
+
+        t, seek["t"] = seek["t"], None
+
+    player.close()
+    cv2.destroyAllWindows()
+
+
+if __name__ == "__main__":
+
+    if len(sys.argv) < 2:
+        print("usage: python recorder.py <recording> [seconds output.jpg]")
+        sys.exit(1)
+
+    # extract a single frame
+    if len(sys.argv) == 4:
+        import cv2
+        p = Player(sys.argv[1])
+        frame = p.image_at(float(sys.argv[2]))
+        if frame is None:
+            print("Recording is empty.")
+            sys.exit(1)
+        cv2.imwrite(sys.argv[3], frame[1])
+        print(f"Saved frame at {frame[0]:.2f}s to {sys.argv[3]}")
+    else:
+        play(sys.argv[1])
@@ -0,0 +1,154 @@
+import os
+import csv
+import time
+import sqlite3
+import logging
+import threading
+
+
+log = logging.getLogger("remotepc.registry")
+
+DB_FILE = "hosts.db"
+LEGACY_CSV = "hosts.csv"    # imported once the first time the database is created
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hosts (
+    name        TEXT PRIMARY KEY,
+    privateip   TEXT,
+    publicip    TEXT,
+    machine     TEXT,       -- hostname the device reports during discovery
+    last_seen   REAL        -- unix time of the last discovery reply, NULL if never seen
+);
+CREATE INDEX IF NOT EXISTS hosts_machine ON hosts(machine);
+
+CREATE TABLE IF NOT EXISTS addresses (
+    name        TEXT,
+    ip          TEXT,
+    kind        TEXT,       -- private or public
+    first_seen  REAL,
+    last_seen   REAL,
+    PRIMARY KEY (name, ip)
+);
+"""
+
+COLUMNS = ("name", "privateip", "publicip", "machine", "last_seen")
+
+
+# known devices, kept in sqlite with an in memory copy so lookups by name never touch the disk
+class HostRegistry:
+
+    def __init__(self, path: str = DB_FILE):
+        self.lock = threading.Lock()
+        new = not os.path.exists(path)
+
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        self.cache = {}     # name -> row dict
+
+        if new:
+            self.import_csv(LEGACY_CSV)
+        self.reload()
+
+    def reload(self):
+        with self.lock:
+            rows = self.db.execute(f"SELECT {', '.join(COLUMNS)} FROM hosts").fetchall()
+            self.cache = {r[0]: dict(zip(COLUMNS, r)) for r in rows}
+
+    # one time move from the old hosts.csv
+    def import_csv(self, path: str):
+
+        if not os.path.exists(path):
+            return
+
+        with open(path, newline="") as csvfile:
+            for row in csv.DictReader(csvfile):
+                name = row.get("hostname", "").strip()
+                if name:
+                    self.add(name, (row.get("privateip") or "").strip(), (row.get("publicip") or "").strip())
+
+        log.info(f"Imported devices from {path} into {DB_FILE}")
+
+    def get(self, name: str) -> dict | None:
+        return self.cache.get(name)
+
+    # every device, sorted by name
+    def all(self) -> list:
+        with self.lock:
+            return sorted(self.cache.values(), key=lambda r: r["name"].lower())
+
+    # add or replace a device entered by hand
+    def add(self, name: str, private_ip: str = "", public_ip: str = ""):
+
+        now = time.time()
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT INTO hosts (name, privateip, publicip) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET privateip = excluded.privateip, publicip = excluded.publicip",
+                (name, private_ip or None, public_ip or None))
+            for ip, kind in ((private_ip, "private"), (public_ip, "public")):
+                if ip:
+                    self.record_address(name, ip, kind, now)
+
+            row = self.cache.get(name, {"name": name, "machine": None, "last_seen": None})
+            row.update(privateip=private_ip or None, publicip=public_ip or None)
+            self.cache[name] = row
+
+    def remove(self, name: str) -> bool:
+        with self.lock, self.db:
+            gone = self.db.execute("DELETE FROM hosts WHERE name = ?", (name,)).rowcount > 0
+            self.db.execute("DELETE FROM addresses WHERE name = ?", (name,))
+            self.cache.pop(name, None)
+        return gone
+
+    # a discovery reply from machine at ip, returns the name it is listed under
+    #   matched by reported hostname first, then by private ip, otherwise it is added as a new device
+    def seen(self, machine: str, ip: str) -> str:
+
+        now = time.time()
+        with self.lock, self.db:
+
+            row = next((r for r in self.cache.values() if r["machine"] == machine), None)
+            if row is None:
+                row = next((r for r in self.cache.values() if r["privateip"] == ip and not r["machine"]), None)
+            if row is None:
+                name = machine if machine not in self.cache else f"{machine} ({ip})"
+                row = {"name": name, "privateip": None, "publicip": None, "machine": None, "last_seen": None}
+                self.db.execute("INSERT INTO hosts (name) VALUES (?)", (name,))
+                self.cache[name] = row
+
+            if row["privateip"] and row["privateip"] != ip:
+                log.info(f"Address of {row['name']} changed from {row['privateip']} to {ip}")
+
+            row.update(privateip=ip, machine=machine, last_seen=now)
+            self.db.execute("UPDATE hosts SET privateip = ?, machine = ?, last_seen = ? WHERE name = ?",
+                            (ip, machine, now, row["name"]))
+            self.record_address(row["name"], ip, "private", now)
+
+        return row["name"]
+
+    # address history (lock must be held, inside a transaction)
+    def record_address(self, name: str, ip: str, kind: str, now: float):
+        self.db.execute(
+            "INSERT INTO addresses (name, ip, kind, first_seen, last_seen) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(name, ip) DO UPDATE SET last_seen = excluded.last_seen",
+            (name, ip, kind, now, now))
+
+    # every address a device has had, newest first
+    def history(self, name: str) -> list:
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT ip, kind, first_seen, last_seen FROM addresses WHERE name = ? ORDER BY last_seen DESC",
+                (name,)).fetchall()
+        return [dict(zip(("ip", "kind", "first_seen", "last_seen"), r)) for r in rows]
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+# one registry per process, the ui and the discovery listener share it
+def shared() -> HostRegistry:
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = HostRegistry()
+        return _shared
@@ -7,7 +7,14 @@ import time
 import json
 import threading 
 import os
+import logging
 import encrypt
+import transfer
+import dirindex
+import discovery
+import clipsync
+import metrics
+import capture
 
 from pynput.mouse import Button, Controller as MouseController
 from pynput.keyboard import Controller as KeyboardController, Key as Key
@@ -16,6 +23,26 @@ from pynput.keyboard import Controller as KeyboardController, Key as Key
 HOST = "0.0.0.0" # listen on all interfaces
 VIDEO_PORT = 5000   # send video on 5000
 CONTROL_PORT = 5001 # send inputs on 5001
+THUMB_PORT = 5002   # dashboard thumbnails on 5002
+
+# dashboard thumbnails
+THUMB_WIDTH = 320
+THUMB_QUALITY = 50
+THUMB_INTERVAL = 1.0        # seconds between screen checks
+THUMB_KEEPALIVE = 15.0      # resend an unchanged thumbnail this often so clients know we are alive
+THUMB_CHANGE = 1.5          # mean pixel difference that counts as a change
+
+log = logging.getLogger("remotepc.server")
+
+# performance counters, see metrics.py
+capture_time = metrics.histogram("capture_seconds", "screen grab and resize time per frame")
+encode_time = metrics.histogram("encode_seconds", "diff and encode time per frame")
+frame_bytes = metrics.histogram("frame_bytes", "encoded video frame size", buckets=metrics.SIZE_BUCKETS)
+frames_sent = metrics.counter("frames_sent", "video frames sent")
+credit_wait = metrics.histogram("credit_wait_seconds", "time the video loop waited for the client to take frames")
+stream_fps = metrics.gauge("stream_fps", "frames per second actually sent")
+input_events = metrics.counter("input_events", "mouse and keyboard events recieved")
+input_latency = metrics.histogram("input_latency_seconds", "time from an input event arriving to it being injected")
 
 mouse = MouseController()
 keyboard = KeyboardController()
@@ -29,25 +56,237 @@ frame_h = 1
 # track if the server is on 
 server_running = False
 
+# directory listings for the remote file browser, kept between connections
+dir_index = dirindex.DirIndex()
 
-# get screen frame to send
-def screen_grab(sct, scale, jpg_q):
+CREDIT_TIMEOUT = 2.0    # seconds without credit before one is assumed lost and refunded
+
+
+# frames the client is ready to take, granted over the control socket
+class FrameCredits:
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.enabled = False    # older clients never send credits, stream freely
+        self.credits = 0
+        self.limit = 0
+        self.last_grant = time.monotonic()
+
+    # client announced flow control with n frames in flight
+    def enable(self, n: int):
+        with self.cond:
+            self.enabled = True
+            self.credits = self.limit = max(1, n)
+            self.last_grant = time.monotonic()
+            self.cond.notify_all()
+
+    # client finished with n frames
+    def grant(self, n: int):
+        with self.cond:
+            self.credits = min(self.limit, self.credits + max(0, n))
+            self.last_grant = time.monotonic()
+            self.cond.notify_all()
+
+    # give back a credit that was taken for a frame that was never sent
+    def release(self):
+        with self.cond:
+            if self.enabled:
+                self.credits = min(self.limit, self.credits + 1)
+                self.cond.notify_all()
+
+    # take a credit for the next frame, False if none arrived within timeout
+    def acquire(self, timeout: float) -> bool:
+        with self.cond:
+            if not self.enabled:
+                return True
+
+            if self.credits <= 0:
+                self.cond.wait_for(lambda: self.credits > 0, timeout)
+
+            # nothing back for a long time, a credit message was probably lost
+            if self.credits <= 0 and time.monotonic() - self.last_grant > CREDIT_TIMEOUT:
+                self.credits = 1
+                self.last_grant = time.monotonic()
+
+            if self.credits <= 0:
+                return False
+
+            self.credits -= 1
+            return True
+
+    # wake the sender so it can notice the server stopping
+    def reset(self):
+        with self.cond:
+            self.enabled = False
+            self.credits = 0
+            self.cond.notify_all()
+
+
+frame_credits = FrameCredits()
+
+
+STREAM_CODECS = {"jpeg": ".jpg", "webp": ".webp"}
+
+
+# fps, scale, quality and codec of the video stream, changed live by the client between frames
+class StreamSettings:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {"fps": 15, "scale": 0.6, "quality": 70, "codec": "jpeg"}
+
+    # apply what is valid out of changes (clamped to sane ranges), returns the effective settings
+    def update(self, changes: dict) -> dict:
+
+        with self.lock:
+            v = dict(self.values)
+            try:
+                if "fps" in changes:
+                    v["fps"] = min(60, max(1, int(changes["fps"])))
+                if "scale" in changes:
+                    v["scale"] = min(1.0, max(0.1, float(changes["scale"])))
+                if "quality" in changes:
+                    v["quality"] = min(100, max(10, int(changes["quality"])))
+                if changes.get("codec") in STREAM_CODECS:
+                    v["codec"] = changes["codec"]
+            except (TypeError, ValueError):
+                pass    # keep what we had for a malformed value
+            self.values = v
+            return dict(v)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return dict(self.values)
+
+
+stream_settings = StreamSettings()
+
+
+INPUT_TICK = 1 / 60     # pointer moves are applied at most once per display refresh
+INPUT_EVENTS = ("mouse_move", "mouse_down", "mouse_up", "key_down", "key_up")
+
+
+# input from the control socket is queued here and injected on its own thread,
+# so a slow pynput call never holds up socket reads
+class InputInjector:
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.events = []        # (arrival time, command) in the order recieved
+        self.running = False
+        self.thread = None
+        self.next_move = 0.0    # earliest time the next pointer move may be applied
+        self.held = set()       # ('mouse'|'key', value) pressed and not yet released
+        self.stats = {"events": 0, "injected": 0, "coalesced": 0, "latency": 0.0, "max_latency": 0.0}
+
+    def start(self):
+        with self.cond:
+            if self.running:
+                return
+            self.running = True
+            self.events = []
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    # stop after the queue drains, anything still held down is released
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        if self.thread:
+            self.thread.join(timeout=1)
+            self.thread = None
+        self.release_held()
+
+    def put(self, cmd: dict):
+        self.put_many([cmd])
+
+    # a client batch, queued together so the moves in it can merge
+    def put_many(self, cmds: list):
+        now = time.monotonic()
+        cmds = [c for c in cmds if isinstance(c, dict) and c.get("type") in INPUT_EVENTS]
+        with self.cond:
+            self.events.extend((now, c) for c in cmds)
+            self.stats["events"] += len(cmds)
+            input_events.inc(len(cmds))
+            self.cond.notify()
+
+    def run(self):
+
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.events or not self.running)
+                if not self.events:
+                    return
+
+                # a move at the front waits for the next tick so the moves behind it can merge
+                if self.events[0][1].get("type") == "mouse_move":
+                    while self.running:
+                        delay = self.next_move - time.monotonic()
+                        if delay <= 0:
+                            break
+                        self.cond.wait(delay)   # new events wake this early, keep waiting
+
+                batch, self.events = self.events, []
+
+            self.inject(batch)
+
+    # apply a batch in order, a run of moves only applies its last position
+    def inject(self, batch: list):
+
+        for i, (arrived, cmd) in enumerate(batch):
+            t = cmd.get("type")
+
+            if t == "mouse_move":
+                if i + 1 < len(batch) and batch[i + 1][1].get("type") == "mouse_move":
+                    self.stats["coalesced"] += 1
+                    continue
+                self.next_move = time.monotonic() + INPUT_TICK
+
+            try:
+                mouse_control(cmd)
+            except Exception as e:
+                log.warning(f"Input injection failed for {cmd}: {e}")
+                continue
+
+            # remember what is held so a dropped connection cant leave it stuck down
+            v = cmd.get("value")
+            if t in ("mouse_down", "key_down"):
+                self.held.add((t[:-5], v))
+            elif t in ("mouse_up", "key_up"):
+                self.held.discard((t[:-3], v))
+
+            latency = time.monotonic() - arrived
+            input_latency.observe(latency)
+            with self.cond:
+                st = self.stats
+                st["injected"] += 1
+                st["latency"] = latency if st["injected"] == 1 else st["latency"] * 0.9 + latency * 0.1
+                st["max_latency"] = max(st["max_latency"], latency)
+
+    def release_held(self):
+        for kind, v in list(self.held):
+            try:
+                mouse_control({"type": f"{kind}_up", "value": v})
+            except Exception:
+                pass
+        self.held.clear()
+
+    # short text for status labels
+    def summary(self) -> str:
+        with self.cond:
+            st = dict(self.stats)
+        return (f"input {st['injected']} injected, {st['coalesced']} merged, "
+                f"latency {st['latency'] * 1000:.1f} ms (max {st['max_latency'] * 1000:.1f} ms)")
+
+
+input_injector = InputInjector()
+metrics.gauge("input_queue", "input events waiting to be injected", fn=lambda: len(input_injector.events))
+
+
+# capture and encode run in their own process, started for each session (see capture.py)
+video_capture = capture.CaptureWorker()
 
-    mon = sct.monitors[1]  # primary display
-    img = np.array(sct.grab(mon))
-    frame = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
-
-    # downscale
-    if scale != 1.0:
-        h, w = frame.shape[:2]
-        frame = cv2.resize(frame, (int(w*scale), int(h*scale)), interpolation=cv2.INTER_AREA)
-
-    # JPEG encode
-    ok, enc = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), jpg_q])
-    if not ok:
-        return None
-    return enc.tobytes()
-    
 
 def mouse_control(command):
 
@@ -88,40 +327,87 @@ def mouse_control(command):
 
 
 def handle_mouse_control(control_conn, PSK):
+
+    transfers = transfer.Transfers(control_conn, PSK, "received_files")
+    clipboard = clipsync.ClipboardSync(control_conn, PSK)
+    input_injector.start()
+
     try:
         while True:
-            cmd = encrypt.recv_json(control_conn, PSK)
+            aad, data = encrypt.recv_any(control_conn, PSK)
 
-            if cmd is None: # catch bad recv 
+            if aad is None: # catch bad recv 
                 break
 
-            # im going to put the file recieve commands in here, for now...
+            # file data for the transfer in progress
+            if aad in transfer.FILE_CHANNELS:
+                transfers.feed(aad, data)
+                continue
+
+            # part of a large clipboard
+            if aad == b"clip":
+                clipboard.feed(data)
+                continue
 
+            cmd = json.loads(data.decode("utf-8"))
             cmd_typ = cmd.get("type")
 
-            # process incoming file
-            if cmd_typ == "file_start":
-                recv_file(control_conn, PSK, cmd)
+            # file offers, chunks and completion
+            if transfers.handle(cmd):
+                continue
 
             # request file from server
-            elif cmd_typ == "request_file":
+            if cmd_typ == "request_file":
                 path = cmd.get("path")
                 if path:
-                    send_file_to_client(control_conn, PSK, path)
+                    send_file_to_client(control_conn, PSK, path, transfers)
+
+            # remote file browser, scans can be slow so they run off the input thread
+            elif cmd_typ in ("browse", "search"):
+                threading.Thread(target=handle_browse, args=(control_conn, PSK, cmd), daemon=True).start()
+
+            # client lost track of its canvas (or started recording), redraw everything next frame
+            elif cmd_typ == "keyframe":
+                video_capture.request_keyframe()
+
+            # client tile cache size, the next keyframe carries the agreed size
+            elif cmd_typ == "tile_cache":
+                video_capture.set_cache_size(int(cmd.get("tiles", 0)))
+
+            # client flow control, frames in flight
+            elif cmd_typ == "flow_control":
+                frame_credits.enable(int(cmd.get("credits", 1)))
+
+            # clipboard from the client
+            elif cmd_typ == "clipboard":
+                clipboard.handle(cmd)
+
+            # change the stream mid session, the video loop picks it up before the next frame
+            elif cmd_typ == "stream_settings":
+                effective = stream_settings.update(cmd)
+                log.info(f"Stream settings now {effective}")
+                encrypt.send_json(control_conn, PSK, {"type": "stream_settings", **effective})
+
+            # client finished painting (or skipped) frames
+            elif cmd_typ == "credit":
+                frame_credits.grant(int(cmd.get("n", 1)))
 
             # process mouse / keyboard movements
-            elif cmd_typ in ("mouse_move", "mouse_down", "mouse_up", "key_down", "key_up"):
-                mouse_control(cmd)
+            elif cmd_typ in INPUT_EVENTS:
+                input_injector.put(cmd)
 
-            # log file completion 
-            elif cmd_typ == "file_end":
-                print(f"File transfer complete: {cmd.get('name')}")
+            # several input events sealed as one message by the client
+            elif cmd_typ == "input_batch":
+                input_injector.put_many(cmd.get("events") or [])
 
             else:
                 # unknown command, theoretically this cant happen
-                print(f"Unknown control command: {cmd}")
+                log.warning(f"Unknown control command: {cmd}")
 
     finally:
+        input_injector.stop()
+        clipboard.close()
+        transfers.close()
         control_conn.close() 
 
 
@@ -141,84 +427,148 @@ def handle_keyboard_control(name: str):
     return name
 
 
-def recv_file(control_conn, PSK, header: dict):
-
-    # get file info
-    filename = header.get("name", "received.bin")
-    size = int(header.get("size", 0))
+# small, infrequent screen previews for any number of dashboard clients
+def thumbnail_service(PSK):
 
-    # save location
-    os.makedirs("received_files", exist_ok=True)
-    path = os.path.join("received_files", filename)
-
-    remaining = size
-
-    with open(path, "wb") as f:
-        
-        while remaining > 0:
-
-            chunk = encrypt.recv_open(control_conn, PSK, aad=b"file")
-
-            # this should only be hit if the program closes prematurly
-            if chunk is None:
-                print("Connection closed while receiving file.")
-                break
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as listener:
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            listener.bind((HOST, THUMB_PORT))
+        except OSError as e:
+            log.error(f"Thumbnail service not started: {e}")
+            return
+        listener.listen(64)
+        listener.settimeout(THUMB_INTERVAL)
+
+        subscribers = []
+        last_small = None   # last thumbnail sent, for change detection
+        last_jpeg = None
+        last_sent = 0.0
+        next_grab = 0.0
+
+        with mss.mss() as sct:
+            while server_running:
+
+                # new dashboards get the current thumbnail straight away
+                try:
+                    conn, addr = listener.accept()
+                    conn.settimeout(2.0)    # never let one slow dashboard hold up the rest
+                    if last_jpeg is None or send_thumb(conn, PSK, last_jpeg):
+                        subscribers.append(conn)
+                except socket.timeout:
+                    pass
+
+                now = time.monotonic()
+                if not subscribers or now < next_grab:
+                    continue
+                next_grab = now + THUMB_INTERVAL
+
+                small = thumbnail_grab(sct)
+                changed = last_small is None or small.shape != last_small.shape or \
+                          float(cv2.absdiff(small, last_small).mean()) > THUMB_CHANGE
+
+                # only send on change (or as a keepalive)
+                if not changed and now - last_sent < THUMB_KEEPALIVE:
+                    continue
+
+                ok, enc = cv2.imencode(".jpg", small, [int(cv2.IMWRITE_JPEG_QUALITY), THUMB_QUALITY])
+                if not ok:
+                    continue
+
+                last_small, last_jpeg, last_sent = small, enc.tobytes(), now
+                subscribers = [c for c in subscribers if send_thumb(c, PSK, last_jpeg)]
+
+        for conn in subscribers:
+            conn.close()
+
+
+# screen downscaled to THUMB_WIDTH
+def thumbnail_grab(sct):
+    mon = sct.monitors[1]
+    img = np.array(sct.grab(mon))
+    h, w = img.shape[:2]
+    size = (THUMB_WIDTH, max(1, int(h * THUMB_WIDTH / w)))
+    return cv2.resize(cv2.cvtColor(img, cv2.COLOR_BGRA2BGR), size, interpolation=cv2.INTER_AREA)
 
-            f.write(chunk)
-            remaining -= len(chunk)
 
-    print(f"Saved file to {path}")
+# False once the dashboard has gone away
+def send_thumb(conn, PSK, jpeg: bytes) -> bool:
+    try:
+        encrypt.send_sealed(conn, PSK, jpeg, aad=b"thumb")
+        return True
+    except OSError:
+        conn.close()
+        return False
 
 
 def stop_server():
     global server_running
     server_running = False
+    frame_credits.reset()
 
 
 # send files along the control socket
-def send_file_to_client(control_socket, PSK, path: str):
+def send_file_to_client(control_socket, PSK, path: str, transfers):
 
     # make sure path is real
-    if not os.path.exists(path):
-        print(f"File not found: {path}")
+    if not os.path.isfile(path):
+        log.warning(f"File not found: {path}")
+        encrypt.send_json(control_socket, PSK, {
+            "type": "file_error",
+            "path": path,
+            "error": "Not a file" if os.path.isdir(path) else "File not found",
+        })
         return
 
-    try:
-        # get file info
-        size = os.path.getsize(path)
-        name = os.path.basename(path)
+    # hashing and sending runs in the background so inputs keep flowing
+    transfers.offer_file(path)
 
-        # send file info 
-        encrypt.send_json(control_socket, PSK, {
-            "type": "file_start",
-            "name": name,
-            "size": size,
-        })
 
-        # send file in chunks
-        with open(path, "rb") as f:
+# answer browse / search requests from the index
+def handle_browse(control_socket, PSK, cmd: dict):
 
-            while True:
+    try:
+        if cmd.get("type") == "browse":
+            reply = dir_index.page(cmd.get("path") or "", int(cmd.get("offset", 0)),
+                                   int(cmd.get("limit", dirindex.PAGE_SIZE)))
+            reply["type"] = "browse_result"
+        else:
+            reply = {
+                "type": "search_result",
+                "prefix": cmd.get("prefix", ""),
+                "results": dir_index.search(cmd.get("prefix", ""), cmd.get("root") or ""),
+            }
+
+    except OSError as err:
+        reply = {"type": f"{cmd.get('type')}_result", "path": cmd.get("path", ""), "error": str(err)}
 
-                chunk = f.read(64 * 1024)
+    try:
+        encrypt.send_json(control_socket, PSK, reply)
+    except OSError:
+        pass    # client went away
 
-                # close transmission once finished
-                if not chunk:
-                    break
 
-                encrypt.send_sealed(control_socket, PSK, chunk, aad=b"file")
+# thumbnail and discovery threads, shared by every session untill the server is stopped
+services = []
 
-        # indicate that the file has completed transmission
-        encrypt.send_json(control_socket, PSK, {
-            "type": "file_end",
-            "name": name,
-        })
+def start_services(PSK):
+
+    global services
+    if any(t.is_alive() for t in services):
+        return
 
-    # 'handel' file send has broken
-    except Exception as err:
-        print(f"Error sending file: {err}")
+    ports = {"video": VIDEO_PORT, "control": CONTROL_PORT, "thumb": THUMB_PORT}
+    services = [
+        # dashboards can watch this machine while waiting for / during a full session
+        threading.Thread(target=thumbnail_service, args=(PSK,), daemon=True),
+        # answer lan discovery probes so clients find this machine without typing its ip
+        threading.Thread(target=discovery.serve, args=(PSK, ports, lambda: server_running), daemon=True),
+    ]
+    for t in services:
+        t.start()
 
 
+# serves one client session, returns when it ends or the server is stopped
 def server_program(FPS, scale, jepg_q):
 
     # set status
@@ -228,9 +578,18 @@ def server_program(FPS, scale, jepg_q):
     # load key
     PSK = encrypt.load_key()
 
-    # initalize sockets
+    # new session, stream freely untill the client asks for flow control
+    frame_credits.reset()
+
+    # start from the configured settings, the client may change them during the session
+    stream_settings.update({"fps": FPS, "scale": scale, "quality": jepg_q, "codec": "jpeg"})
+
+    start_services(PSK)
+
+    # initalize sockets, the capture worker starts now so it is ready by the time a client connects
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as control_socket, \
-         socket.socket(socket.AF_INET, socket.SOCK_STREAM) as video_socket:
+         socket.socket(socket.AF_INET, socket.SOCK_STREAM) as video_socket, \
+         video_capture:
 
         # adjust timeouts
         control_socket.settimeout(1.0)
@@ -248,13 +607,13 @@ def server_program(FPS, scale, jepg_q):
 
 
         # control connect
-        print(f"Control listening on {HOST}:{CONTROL_PORT}")
+        log.info(f"Control listening on {HOST}:{CONTROL_PORT}")
         control_conn = None
 
         while server_running and control_conn is None:
             try:
                 control_conn, control_addr = control_socket.accept()
-                print("Control connection from:", control_addr)
+                log.info(f"Control connection from: {control_addr}")
             except socket.timeout:
                 continue
 
@@ -265,13 +624,13 @@ def server_program(FPS, scale, jepg_q):
         threading.Thread(target=handle_mouse_control, args=(control_conn, PSK), daemon=True).start() # handle controls in seperate thread
 
         # video connect
-        print(f"Video listening on {HOST}:{VIDEO_PORT}")
+        log.info(f"Video listening on {HOST}:{VIDEO_PORT}")
         video_conn = None
 
         while server_running and video_conn is None:
             try:
                 video_conn, video_addr = video_socket.accept()
-                print("Video connection from:", video_addr)
+                log.info(f"Video connection from: {video_addr}")
             except socket.timeout:
                 continue
 
@@ -281,38 +640,58 @@ def server_program(FPS, scale, jepg_q):
 
         
         with video_conn:
-            with mss.mss() as sct:
-                frame_interval = 1.0 / FPS
 
-                mon = sct.monitors[1]   #only main monitor for now 
+            global screen_w, screen_h, frame_w, frame_h     # use global values
 
-                global screen_w, screen_h, frame_w, frame_h     # use global values
+            last_sent = 0.0     # for the achieved fps gauge
 
-                # get screen size
-                screen_w = mon['width']
-                screen_h = mon['height']
-                frame_w = int(screen_w * scale)
-                frame_h = int(screen_h * scale)
+            while server_running:
 
-                # share screen size 
-                screen_w, screen_h = screen_w, screen_h
-                frame_w, frame_h = frame_w, frame_h
+                # settings can change between any two frames
+                current = stream_settings.snapshot()
+                frame_interval = 1.0 / current["fps"]
 
-                while server_running:
+                # no credit means the client is still busy, skip capture and encode entirely
+                with credit_wait.time():
+                    has_credit = frame_credits.acquire(timeout=frame_interval)
+                if not has_credit:
+                    continue
 
-                    t0 = time.time()
+                t0 = time.time()
 
-                    data = screen_grab(sct, scale, jepg_q)
-                    if data is None:
-                        continue
+                try:
+                    data, info = video_capture.grab(current, running=lambda: server_running)
+                except RuntimeError as e:
+                    log.error(str(e))
+                    break
+                if info is None:
+                    break   # server stopped while waiting
+
+                capture_time.observe(info["capture"])
+                encode_time.observe(info["encode"])
+
+                # share screen and frame size for mouse scaling
+                screen_w, screen_h = info["screen_w"], info["screen_h"]
+                frame_w, frame_h = info["w"], info["h"]
 
-                    try:
-                        encrypt.send_sealed(video_conn, PSK, data, aad=b"video")
-                    except OSError:
-                        break
+                if data is None:
+                    frame_credits.release()     # encoding failed, the client never sees this frame
+                    continue
+                frame_bytes.observe(len(data))
+
+                try:
+                    encrypt.send_sealed(video_conn, PSK, data, aad=b"video")
+                except OSError:
+                    break
 
-                    # throttle FPS
-                    elapsed = time.time() - t0
-                    sleep = frame_interval - elapsed
-                    if sleep > 0:
-                        time.sleep(sleep)
+                frames_sent.inc()
+                now = time.monotonic()
+                if last_sent:
+                    stream_fps.set(stream_fps.value * 0.9 + 0.1 / max(now - last_sent, 1e-3))
+                last_sent = now
+
+                # throttle FPS
+                elapsed = time.time() - t0
+                sleep = frame_interval - elapsed
+                if sleep > 0:
+                    time.sleep(sleep)
\ No newline at end of file
@@ -0,0 +1,157 @@
+import os
+import sys
+import json
+import time
+import signal
+import logging
+import argparse
+import configparser
+
+import shaper
+
+# headless server, runs sessions back to back without Qt
+# usage: python serverd.py [--config server.ini] [--fps 15] [--scale .6] [--quality 70] ...
+#
+# server.ini (every key optional):
+#   [server]
+#   fps = 15
+#   scale = 0.6
+#   jpeg_quality = 70
+#   upload_limit = 0        ; Mbit/s, 0 = no limit
+#   video_min = 2           ; Mbit/s kept for video when the link is shared
+#   log_file =              ; empty logs to stderr
+#   log_format = json       ; json or text
+#   metrics_port = 0        ; prometheus endpoint on localhost, 0 = off
+
+CONFIG_FILE = "server.ini"
+
+DEFAULTS = {
+    "fps": 15,
+    "scale": 0.6,
+    "jpeg_quality": 70,
+    "upload_limit": 0.0,
+    "video_min": 2.0,
+    "log_file": "",
+    "log_format": "json",
+    "metrics_port": 0,
+}
+
+log = logging.getLogger("remotepc.serverd")
+
+stopping = False
+
+
+# one json object per line, easy for journald / log shippers to pick apart
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+# defaults < config file < command line
+def load_settings(args) -> dict:
+
+    settings = dict(DEFAULTS)
+
+    path = args.config or CONFIG_FILE
+    if os.path.exists(path):
+        parser = configparser.ConfigParser()
+        parser.read(path)
+        if parser.has_section("server"):
+            for key, default in DEFAULTS.items():
+                if parser.has_option("server", key):
+                    raw = parser.get("server", key)
+                    settings[key] = type(default)(raw) if raw != "" or isinstance(default, str) else default
+    elif args.config:
+        raise SystemExit(f"Config file not found: {args.config}")
+
+    for key in DEFAULTS:
+        value = getattr(args, key, None)
+        if value is not None:
+            settings[key] = value
+
+    return settings
+
+
+def setup_logging(settings: dict):
+
+    handler = logging.FileHandler(settings["log_file"]) if settings["log_file"] else logging.StreamHandler()
+    if settings["log_format"] == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(logging.INFO)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="remotepc server without the ui")
+    parser.add_argument("--config", help=f"settings file (default {CONFIG_FILE} if present)")
+    parser.add_argument("--fps", type=int)
+    parser.add_argument("--scale", type=float)
+    parser.add_argument("--quality", dest="jpeg_quality", type=int)
+    parser.add_argument("--upload-limit", dest="upload_limit", type=float, help="Mbit/s, 0 = no limit")
+    parser.add_argument("--video-min", dest="video_min", type=float, help="Mbit/s kept for video")
+    parser.add_argument("--log-file", dest="log_file")
+    parser.add_argument("--log-format", dest="log_format", choices=("json", "text"))
+    parser.add_argument("--metrics-port", dest="metrics_port", type=int, help="serve prometheus metrics on localhost")
+    parser.add_argument("--once", action="store_true", help="exit after the first session")
+    args = parser.parse_args()
+
+    settings = load_settings(args)
+    setup_logging(settings)
+
+    # imported after logging is set up, this is where cv2, mss and pynput load
+    import server
+
+    # same conversion as the settings page, Mbit/s to bytes/s
+    shaper.configure(settings["upload_limit"] * 125_000, video_min=settings["video_min"] * 125_000, input_min=32_000)
+
+    def shutdown(signum, frame):
+        global stopping
+        log.info(f"Stopping on {signal.Signals(signum).name}")
+        stopping = True
+        server.stop_server()
+
+    if settings["metrics_port"]:
+        import metrics
+        port = metrics.serve(settings["metrics_port"])
+        log.info(f"Metrics on http://127.0.0.1:{port}/metrics")
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    log.info(f"Server starting fps={settings['fps']} scale={settings['scale']} quality={settings['jpeg_quality']} "
+             f"upload_limit={settings['upload_limit']}Mbit/s pid={os.getpid()}")
+
+    # server_program serves one session, keep accepting new ones untill told to stop
+    while not stopping:
+        try:
+            server.server_program(settings["fps"], settings["scale"], settings["jpeg_quality"])
+        except Exception:
+            log.exception("Session failed")
+            time.sleep(1)   # dont spin if the ports are unavailable
+
+        if args.once:
+            break
+        if not stopping:
+            log.info("Session ended, waiting for the next client")
+
+    server.stop_server()
+    log.info("Server stopped")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
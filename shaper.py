@@ -0,0 +1,188 @@
+import math
+import threading
+import time
+
+
+# traffic classes, highest priority first
+INPUT = "input"
+VIDEO = "video"
+BULK = "bulk"
+CLASSES = (INPUT, VIDEO, BULK)
+
+# which class each message channel belongs to
+CLASS_FOR = {b"control": INPUT, b"video": VIDEO, b"thumb": VIDEO,
+             b"file": BULK, b"file-zlib": BULK, b"file-zstd": BULK, b"clip": BULK}
+
+# control messages bigger than this (file offers with their hash lists, browse and search pages, inline
+# clipboards) are bulk, input batches and credits are far smaller and keep the input class to themselves
+LARGE_CONTROL = 8 * 1024
+
+BURST = 0.05        # seconds of traffic a bucket can save up
+RATE_WINDOW = 1.0   # seconds the live rate counters average over
+
+
+# token buckets shared by every socket in the process
+#   each class has a guaranteed rate it can always use,
+#   the rest of the link is a shared pool that input borrows from first, then video, then bulk
+class Shaper:
+
+    def __init__(self, rate: float = 0, video_min: float = 0, input_min: float = 0, bulk_min: float = 0):
+        self.cond = threading.Condition()
+        self.counters = {c: {"bytes": 0, "messages": 0, "waited": 0.0, "rate": 0.0, "stamp": time.monotonic()}
+                         for c in CLASSES}
+        self.configure(rate, video_min, input_min, bulk_min)
+
+    # rates are in bytes per second, rate 0 turns shaping off (counters still run)
+    def configure(self, rate: float, video_min: float = 0, input_min: float = 0, bulk_min: float = 0):
+
+        with self.cond:
+            self.rate = max(0.0, float(rate))
+
+            # guarantees cant add up to more than the link
+            mins = {INPUT: input_min, VIDEO: video_min, BULK: bulk_min}
+            total = sum(mins.values())
+            if self.rate and total > self.rate:
+                mins = {c: v * self.rate / total for c, v in mins.items()}
+
+            self.mins = {c: max(0.0, float(v)) for c, v in mins.items()}
+            self.shared_rate = max(0.0, self.rate - sum(self.mins.values()))
+
+            # bucket sizes, at least one full sized message so nothing waits forever
+            self.caps = {c: max(64 * 1024, v * BURST) for c, v in self.mins.items()}
+            self.shared_cap = max(256 * 1024, self.rate * BURST)
+
+            # how full the shared pool must be before a class can borrow from it
+            self.thresholds = {INPUT: -math.inf, VIDEO: 0.0, BULK: self.shared_cap / 2}
+
+            self.tokens = dict(self.caps)
+            self.shared = self.shared_cap
+            self.stamp = time.monotonic()
+            self.cond.notify_all()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    # add tokens for the time since the last call (lock must be held)
+    def refill(self, now: float):
+
+        dt = now - self.stamp
+        self.stamp = now
+        if dt <= 0:
+            return
+
+        for c in CLASSES:
+            self.tokens[c] += self.mins[c] * dt
+
+            # unused guarantee is lent to the shared pool
+            extra = self.tokens[c] - self.caps[c]
+            if extra > 0:
+                self.tokens[c] = self.caps[c]
+                self.shared += extra
+
+        self.shared = min(self.shared_cap, self.shared + self.shared_rate * dt)
+
+    # block untill cls is allowed to send n bytes
+    def throttle(self, cls: str, n: int):
+
+        waited = 0.0
+
+        with self.cond:
+
+            while self.enabled:
+                now = time.monotonic()
+                self.refill(now)
+
+                # own guarantee first (can go into debt for large messages)
+                if self.tokens[cls] >= 0:
+                    self.tokens[cls] -= n
+                    break
+
+                # then borrow from the shared pool if it is full enough for this class
+                if self.shared >= self.thresholds[cls]:
+                    self.shared -= n
+                    break
+
+                # sleep untill either bucket could have recovered
+                waits = []
+                if self.mins[cls]:
+                    waits.append(-self.tokens[cls] / self.mins[cls])
+                if self.shared_rate:
+                    waits.append((self.thresholds[cls] - self.shared) / self.shared_rate)
+                delay = min(min(waits, default=0.01), 0.05)
+
+                self.cond.wait(max(delay, 0.001))
+                waited += time.monotonic() - now
+
+            self.count(cls, n, waited)
+
+    # update live counters (lock must be held)
+    def count(self, cls: str, n: int, waited: float):
+
+        c = self.counters[cls]
+        now = time.monotonic()
+
+        # exponentially decayed rate, bytes per second
+        c["rate"] = c["rate"] * math.exp(-(now - c["stamp"]) / RATE_WINDOW) + n / RATE_WINDOW
+        c["stamp"] = now
+        c["bytes"] += n
+        c["messages"] += 1
+        c["waited"] += waited
+
+    # snapshot of how the link is being shared
+    def stats(self) -> dict:
+
+        now = time.monotonic()
+        out = {}
+
+        with self.cond:
+            for cls, c in self.counters.items():
+                out[cls] = {
+                    "bytes": c["bytes"],
+                    "messages": c["messages"],
+                    "waited": c["waited"],
+                    "rate": c["rate"] * math.exp(-(now - c["stamp"]) / RATE_WINDOW),
+                }
+
+        return out
+
+
+# one shaper for the whole process, starts with shaping off
+_active = Shaper()
+
+
+def active() -> Shaper:
+    return _active
+
+
+def configure(rate: float, video_min: float = 0, input_min: float = 0, bulk_min: float = 0):
+    _active.configure(rate, video_min, input_min, bulk_min)
+
+
+# called before a message on the channel aad is written to a socket
+def throttle(aad: bytes, n: int):
+    cls = CLASS_FOR.get(aad, BULK)
+    if cls == INPUT and n > LARGE_CONTROL:
+        cls = BULK
+    _active.throttle(cls, n)
+
+
+def stats() -> dict:
+    return _active.stats()
+
+
+# short text for status labels, ie: "input 1.2 KB/s  video 2.0 MB/s  files 0 B/s"
+def summary() -> str:
+
+    names = {INPUT: "input", VIDEO: "video", BULK: "files"}
+    parts = []
+
+    for cls, c in stats().items():
+        rate = c["rate"]
+        for unit in ("B/s", "KB/s", "MB/s"):
+            if rate < 1024 or unit == "MB/s":
+                break
+            rate /= 1024
+        parts.append(f"{names[cls]} {rate:.1f} {unit}")
+
+    return "   ".join(parts)
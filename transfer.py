@@ -0,0 +1,647 @@
+import os
+import mmap
+import time
+import zlib
+import uuid
+import queue
+import logging
+import threading
+import encrypt
+import metrics
+import chunkstore
+
+# zstd is optional, fall back to zlib when it is not installed
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+log = logging.getLogger("remotepc.transfer")
+
+NEED_TIMEOUT = 60.0     # seconds to wait for the reciever to answer an offer
+QUEUE_DEPTH = 4         # sealed chunks waiting to be sent while the next ones are prepared
+READ_AHEAD = 4 * 1024 * 1024    # bytes of the source file paged in ahead of the sender
+RECV_QUEUE = 256        # recieved messages waiting for the assembly thread before the reader blocks
+
+# chunk codecs, each is sent on its own channel so the codec is authenticated
+CODEC_RAW = 0
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+CODEC_AAD = {CODEC_RAW: b"file", CODEC_ZLIB: b"file-zlib", CODEC_ZSTD: b"file-zstd"}
+AAD_CODEC = {v: k for k, v in CODEC_AAD.items()}
+FILE_CHANNELS = frozenset(CODEC_AAD.values())
+
+SAMPLE_SIZE = 4 * 1024      # bytes tested before compressing a chunk
+SKIP_RATIO = 0.9            # samples that do not shrink below this are sent raw
+
+# levels the tuner steps through (fastest first)
+ZLIB_LEVELS = (1, 3, 6, 9)
+ZSTD_LEVELS = (1, 3, 6, 12)
+
+file_bytes_sent = metrics.counter("file_bytes_sent", "file bytes sent, before compression")
+file_bytes_received = metrics.counter("file_bytes_received", "file chunk bytes received off the socket")
+file_chunks_reused = metrics.counter("file_chunks_reused", "chunks taken from the local chunk cache instead of the network")
+
+
+# picks a compression level that keeps up with the measured link speed
+class LevelTuner:
+
+    def __init__(self, codec: int | None = None):
+
+        # prefer zstd when avalible
+        if codec is None:
+            codec = CODEC_ZSTD if zstandard else CODEC_ZLIB
+
+        self.codec = codec
+        self.levels = ZSTD_LEVELS if codec == CODEC_ZSTD else ZLIB_LEVELS
+        self.index = 0
+        self.enabled = True     # turned off when even the fastest level is too slow
+        self.skipped = 0        # chunks sent raw since compression was disabled
+
+        # running averages in bytes of file data per second
+        self.compress_rate = 0.0
+        self.link_rate = 0.0
+
+        self._compressors = {}
+
+    @property
+    def level(self) -> int:
+        return self.levels[self.index]
+
+    def compress(self, data) -> bytes:
+
+        if self.codec == CODEC_ZSTD:
+            comp = self._compressors.get(self.level)
+            if comp is None:
+                comp = zstandard.ZstdCompressor(level=self.level)
+                self._compressors[self.level] = comp
+            return comp.compress(data)
+
+        return zlib.compress(data, self.level)
+
+    # update speed averages after a chunk was compressed and sent
+    def record(self, raw_len: int, compress_time: float, send_time: float):
+
+        if compress_time > 0:
+            self.compress_rate = ewma(self.compress_rate, raw_len / compress_time)
+        if send_time > 0:
+            self.link_rate = ewma(self.link_rate, raw_len / send_time)
+
+        if not self.compress_rate or not self.link_rate:
+            return
+
+        # compression is the bottleneck, back off
+        if self.compress_rate < self.link_rate * 1.5:
+            if self.index > 0:
+                self.index -= 1
+            else:
+                self.enabled = False
+                self.skipped = 0
+
+        # plenty of headroom, try a stronger level
+        elif self.compress_rate > self.link_rate * 4 and self.index < len(self.levels) - 1:
+            self.index += 1
+            self.compress_rate = 0.0     # re-measure at the new level
+
+    # after compression was disabled every so often check if the link got slower
+    def should_retry(self) -> bool:
+        self.skipped += 1
+        if self.skipped >= 64:
+            self.enabled = True
+            self.compress_rate = 0.0
+            self.link_rate = 0.0
+            return True
+        return False
+
+
+def ewma(old: float, new: float, alpha: float = 0.3) -> float:
+    if not old:
+        return new
+    return old + alpha * (new - old)
+
+
+# quick test on a slice of the chunk to spot already-compressed data (media, archives)
+def looks_compressible(data) -> bool:
+
+    if len(data) < 512:
+        return False
+
+    mid = max(0, len(data) // 2 - SAMPLE_SIZE // 2)
+    sample = bytes(data[mid:mid + SAMPLE_SIZE])
+
+    return len(zlib.compress(sample, 1)) < len(sample) * SKIP_RATIO
+
+
+# compress a chunk if it is worth it, returns (codec, payload)
+def encode_chunk(data, tuner: LevelTuner | None):
+
+    if tuner is None:
+        return CODEC_RAW, data
+
+    if not tuner.enabled and not tuner.should_retry():
+        return CODEC_RAW, data
+
+    if not looks_compressible(data):
+        return CODEC_RAW, data
+
+    packed = tuner.compress(data)
+
+    # incompressible after all
+    if len(packed) >= len(data):
+        return CODEC_RAW, data
+
+    return tuner.codec, packed
+
+
+# undo encode_chunk on the receiving side
+def decode_chunk(aad: bytes, payload) -> bytes:
+
+    codec = AAD_CODEC.get(aad)
+
+    if codec == CODEC_RAW:
+        return payload
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(payload)
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise ValueError("received zstd chunk but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(payload)
+
+    raise ValueError(f"unknown chunk channel {aad!r}")
+
+
+# read only map of a file, empty files cant be mapped
+def map_file(f, size: int):
+    if size == 0:
+        return None
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+# ask the os to start reading the next part of the file before it is needed
+def read_ahead(mm, offset: int):
+    if mm is None or not hasattr(mm, "madvise") or not hasattr(mmap, "MADV_WILLNEED"):
+        return
+    start = offset - offset % mmap.PAGESIZE
+    length = min(READ_AHEAD, len(mm) - start)
+    if length > 0:
+        mm.madvise(mmap.MADV_WILLNEED, start, length)
+
+
+# file being written on the recieving side, chunks come from the socket or the local store
+class IncomingFile:
+
+    def __init__(self, path: str, size: int, chunks=None, need=(), store=None):
+        self.path = path
+        self.size = size
+        self.chunks = chunks        # [[hash, size], ...] or None for a plain stream
+        self.need = set(need)       # chunk indices the sender will send
+        self.store = store
+        self.next = 0               # index of the next chunk to write
+        self.offset = 0
+        self.written = {}           # hash -> offset, for chunks repeated inside the file
+        self.tmp = path + ".part"   # renamed to path once complete, an existing file is untouched untill then
+        self.f = None
+        self.mm = None
+        self.saved = False          # complete and renamed into place
+
+    # create the file on file_start, an offer that is never started leaves nothing on disk
+    def open(self):
+
+        self.f = open(self.tmp, "w+b")
+
+        # reserve the whole file up front and write chunks straight into a map of it
+        if self.size:
+            self.f.truncate(self.size)
+            if hasattr(os, "posix_fallocate"):
+                try:
+                    os.posix_fallocate(self.f.fileno(), 0, self.size)
+                except OSError:
+                    pass    # file system without fallocate, the sparse file still works
+            self.mm = mmap.mmap(self.f.fileno(), self.size)
+
+    # write cached chunks untill the next one that has to come over the network
+    def fill(self):
+
+        if self.chunks is None:
+            return
+
+        while self.next < len(self.chunks) and self.next not in self.need:
+            h, n = self.chunks[self.next]
+            data = self.cached(h, n)
+            if data is None or len(data) != n:
+                raise ValueError(f"chunk {h} missing from local store")
+            self.write(h, data)
+            file_chunks_reused.inc()
+
+    def cached(self, h: str, n: int):
+
+        # earlier in this same file
+        if h in self.written:
+            off = self.written[h]
+            return self.mm[off:off + n]
+
+        return self.store.get(h) if self.store else None
+
+    def write(self, h, data):
+
+        end = self.offset + len(data)
+        if end > self.size:
+            raise ValueError("more data than the announced file size")
+
+        if h is not None and h not in self.written:
+            self.written[h] = self.offset
+
+        if self.mm is not None:
+            self.mm[self.offset:end] = data
+        self.offset = end
+        self.next += 1
+
+    # handle one chunk from the socket
+    def feed(self, aad: bytes, payload):
+
+        file_bytes_received.inc(len(payload))
+        data = decode_chunk(aad, payload)
+
+        if self.chunks is None:
+            self.write(None, data)
+            return
+
+        if self.next >= len(self.chunks):
+            raise ValueError("more chunks than offered")
+
+        # make sure the chunk is what was offered before it goes in the store
+        h, n = self.chunks[self.next]
+        if len(data) != n or chunkstore.chunk_hash(data) != h:
+            raise ValueError(f"chunk {self.next} does not match its hash")
+
+        if self.store:
+            self.store.put(h, data)
+
+        self.write(h, data)
+        self.fill()
+
+    def close(self):
+
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+            # only a finished file replaces the destination, a failed one is thrown away
+            try:
+                if self.complete:
+                    os.replace(self.tmp, self.path)
+                    self.saved = True
+                else:
+                    os.remove(self.tmp)
+            except OSError as err:
+                log.error(f"Cannot save {self.path}: {err}")
+
+        if self.store and self.chunks:
+            self.store.unpin(h for h, _ in self.chunks)
+            self.store.flush()
+
+    @property
+    def complete(self) -> bool:
+        return self.offset == self.size
+
+
+# file transfers over one control socket, shared by both ends
+class Transfers:
+
+    def __init__(self, sock, key: bytes, folder: str, store: chunkstore.ChunkStore | None = None, compress: bool = True):
+        self.sock = sock
+        self.key = key
+        self.folder = folder
+        self.store = store if store is not None else chunkstore.shared()
+        self.compress = compress
+
+        self.out_lock = threading.Lock()    # one outgoing transfer at a time, chunks cant interleave
+        self.waiting = {}                   # transfer id -> [event, needed indices]
+        self.offers = {}                    # transfer id -> IncomingFile waiting for file_start
+        self.active = None                  # IncomingFile currently recieving chunks
+
+        # offers, chunks and assembly are handled on their own thread in arrival order
+        self.inbox = queue.Queue(RECV_QUEUE)
+        self.assembler = None
+        self.closed = False
+
+    # ---- sending side ----
+
+    # hash, offer and send a file in the background
+    def offer_file(self, path: str):
+        threading.Thread(target=self.send_file, args=(path,), daemon=True).start()
+
+    def send_file(self, path: str):
+
+        try:
+            with self.out_lock:
+                self._send_file(path)
+
+        # 'handel' file send has broken
+        except Exception as err:
+            log.error(f"Error sending file: {err}")
+
+    def _send_file(self, path: str):
+
+        # get file info
+        size = os.path.getsize(path)
+        name = os.path.basename(path)
+        tid = uuid.uuid4().hex[:12]
+
+        with open(path, "rb") as f:
+
+            # the mapped file is hashed, compressed and encrypted without reading it into python bytes
+            mm = map_file(f, size)
+            try:
+                self._send_mapped(tid, name, size, mm)
+            finally:
+                if mm is not None:
+                    mm.close()
+
+    def _send_mapped(self, tid: str, name: str, size: int, mm):
+
+        # split into content defined chunks
+        chunks = []     # (offset, hash, size)
+        if mm is not None:
+            with memoryview(mm) as view:
+                for off, data in chunkstore.iter_chunks(view):
+                    chunks.append((off, chunkstore.chunk_hash(data), len(data)))
+                    data.release()
+
+        event = threading.Event()
+        self.waiting[tid] = [event, None]
+
+        # offer the chunk hashes and wait for the list the reciever is missing
+        encrypt.send_json(self.sock, self.key, {
+            "type": "file_offer",
+            "id": tid,
+            "name": name,
+            "size": size,
+            "chunks": [[h, n] for _, h, n in chunks],
+        })
+
+        if not event.wait(NEED_TIMEOUT):
+            self.waiting.pop(tid, None)
+            raise TimeoutError(f"no reply to offer for {name}")
+
+        # close() wakes every waiting offer without an answer
+        entry = self.waiting.pop(tid, None)
+        need = entry[1] if entry else None
+        if need is None:
+            raise ConnectionError(f"connection closed before {name} was accepted")
+
+        # send file info
+        encrypt.send_json(self.sock, self.key, {
+            "type": "file_start",
+            "id": tid,
+            "name": name,
+            "size": size,
+        })
+
+        # send only the chunks the reciever does not have
+        sent = self.stream_chunks(mm, [chunks[i] for i in need])
+
+        # indicate that the file has completed transmission
+        encrypt.send_json(self.sock, self.key, {
+            "type": "file_end",
+            "id": tid,
+            "name": name,
+        })
+
+        log.info(f"Sent {name}: {sent} of {size} bytes, {len(chunks) - len(need)} chunks reused")
+
+    # compress and seal chunks on a helper thread while this one sends, returns bytes sent
+    def stream_chunks(self, mm, items) -> int:
+
+        if not items:
+            return 0
+
+        tuner = LevelTuner() if self.compress else None
+        stop = threading.Event()
+
+        # a few reusable frame buffers cycle between the two threads, memory stays flat
+        free = queue.Queue()
+        ready = queue.Queue()
+        for _ in range(QUEUE_DEPTH):
+            free.put(bytearray(chunkstore.MAX_CHUNK + 64))
+
+        def produce():
+            try:
+                with memoryview(mm) as view:
+                    for off, _, n in items:
+
+                        read_ahead(mm, off + n)
+
+                        # wait for a buffer the sender has finished with
+                        buf = None
+                        while buf is None:
+                            if stop.is_set():
+                                return
+                            try:
+                                buf = free.get(timeout=0.2)
+                            except queue.Empty:
+                                pass
+
+                        with view[off:off + n] as data:
+                            t0 = time.perf_counter()
+                            codec, payload = encode_chunk(data, tuner)
+                            t1 = time.perf_counter()
+                            aad = CODEC_AAD[codec]
+                            size = encrypt.seal_into(self.key, payload, aad, buf)
+                            del payload
+
+                        ready.put((buf, size, aad, n, codec, t1 - t0))
+
+            except Exception as err:
+                ready.put(err)
+                return
+
+            ready.put(None)
+
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+
+        sent = 0
+        try:
+            while True:
+                item = ready.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+
+                buf, size, aad, n, codec, compress_time = item
+
+                t0 = time.perf_counter()
+                with memoryview(buf) as view:
+                    encrypt.send_frame(self.sock, aad, view[:size])
+                send_time = time.perf_counter() - t0
+
+                free.put(buf)
+                sent += n
+                file_bytes_sent.inc(n)
+
+                if tuner and codec != CODEC_RAW:
+                    tuner.record(n, compress_time, send_time)
+
+        finally:
+            stop.set()
+            producer.join()
+
+        return sent
+
+    # ---- recieving side ----
+
+    # returns True if the control message was a file transfer message
+    def handle(self, cmd: dict) -> bool:
+
+        t = cmd.get("type")
+
+        if t in ("file_offer", "file_start", "file_end"):
+            self.queue_work(t, cmd)
+        elif t == "file_need":
+            entry = self.waiting.get(cmd.get("id"))
+            if entry:
+                entry[1] = sorted(int(i) for i in cmd.get("need", []))
+                entry[0].set()
+        else:
+            return False
+
+        return True
+
+    # file data from the socket
+    def feed(self, aad: bytes, payload):
+        self.queue_work("chunk", (aad, payload))
+
+    # called on the control reading thread, which also carries input and credits, so it only queues
+    def queue_work(self, kind: str, arg):
+        if self.assembler is None:
+            self.assembler = threading.Thread(target=self.assemble, daemon=True)
+            self.assembler.start()
+        self.inbox.put((kind, arg))
+
+    # checking the store (a stat per chunk), allocating the file and copying cached chunks
+    # can take seconds for a large file, none of it holds up the control socket
+    def assemble(self):
+
+        while True:
+            item = self.inbox.get()
+            if item is None:
+                break
+            if self.closed:
+                continue    # connection is gone, drop what was still queued
+
+            kind, arg = item
+            try:
+                if kind == "chunk":
+                    self.on_chunk(*arg)
+                elif kind == "file_offer":
+                    self.on_offer(arg)
+                elif kind == "file_start":
+                    self.on_start(arg)
+                else:
+                    self.on_end(arg)
+            except Exception as err:
+                log.error(f"File transfer error: {err}")
+
+        self.release()
+
+    def target_path(self, name) -> str:
+        os.makedirs(self.folder, exist_ok=True)
+        return os.path.join(self.folder, os.path.basename(name or "received.bin"))
+
+    # reply with the chunks missing from the local store
+    def on_offer(self, cmd: dict):
+
+        tid = cmd.get("id")
+        chunks = [(str(h), int(n)) for h, n in cmd.get("chunks", [])]
+
+        # cached chunks must survive untill the file is assembled, pinned before they are looked up
+        # so another transfer sharing the store cant evict one between the check and the pin
+        self.store.pin(h for h, _ in chunks)
+
+        need = []
+        seen = set()
+        for i, (h, _) in enumerate(chunks):
+            if h not in seen and not self.store.has(h):
+                need.append(i)
+            seen.add(h)
+
+        try:
+            self.offers[tid] = IncomingFile(self.target_path(cmd.get("name")), int(cmd.get("size", 0)),
+                                            chunks=chunks, need=need, store=self.store)
+        except OSError as err:
+            self.store.unpin(h for h, _ in chunks)
+            log.error(f"Cannot recieve file: {err}")
+            return
+
+        encrypt.send_json(self.sock, self.key, {"type": "file_need", "id": tid, "need": need})
+
+    def on_start(self, cmd: dict):
+
+        incoming = self.offers.pop(cmd.get("id"), None)
+
+        # sender skipped the offer, plain stream of chunks
+        if incoming is None:
+            incoming = IncomingFile(self.target_path(cmd.get("name")), int(cmd.get("size", 0)))
+
+        self.active = incoming
+
+        try:
+            incoming.open()
+            incoming.fill()     # chunks before the first missing one
+        except Exception as err:
+            self.abort(err)
+
+    def on_chunk(self, aad: bytes, payload):
+
+        if self.active is None:
+            return  # transfer was aborted, drop the rest of its chunks
+
+        try:
+            self.active.feed(aad, payload)
+        except Exception as err:
+            self.abort(err)
+
+    def on_end(self, cmd: dict):
+
+        incoming, self.active = self.active, None
+        if incoming is None:
+            return
+
+        incoming.close()
+
+        if incoming.saved:
+            log.info(f"Saved file to {incoming.path}")
+        else:
+            log.warning(f"Incomplete file {incoming.path} discarded: {incoming.offset} of {incoming.size} bytes")
+
+    def abort(self, err):
+        log.error(f"Error recieving file: {err}")
+        if self.active:
+            self.active.close()
+        self.active = None
+
+    # connection closed, release anything half done once the assembly thread is idle
+    def close(self):
+        self.closed = True
+        for entry in self.waiting.values():
+            entry[0].set()
+
+        if self.assembler is None:
+            self.release()
+        else:
+            self.inbox.put(None)
+
+    def release(self):
+        if self.active:
+            self.active.close()
+            self.active = None
+        for incoming in self.offers.values():
+            incoming.close()
+        self.offers.clear()